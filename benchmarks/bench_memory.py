@@ -0,0 +1,67 @@
+"""Reports per-page memory of the page model: the old PageData vs the slotted PageData + ThumbnailStore.
+
+Each model is measured in a fresh subprocess from the growth of its resident set size (Linux).
+Usage: python benchmarks/bench_memory.py [--pages 5000]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LETTER_AT_40_DPI = (340, 440) # What convert_from_path(dpi=40) returns for a US Letter page
+
+class LegacyPageData:
+    """The page model before the compact store: a full 40-DPI image, a label and an id per page."""
+    def __init__(self, source_path, page_index, image, display_index_str):
+        self.source_path = source_path
+        self.page_index = page_index
+        self.image = image
+        self.display_index_str = display_index_str
+        self.id = f"{source_path}_{page_index}"
+
+def rss_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def measure(model, pages):
+    from PIL import Image
+    import pdf_engine
+
+    sources = [f"/data/scans/batch_{n:02d}/contract_{n:04d}.pdf" for n in range(5)]
+    per_source = pages // len(sources)
+    before = rss_bytes()
+    keep = []
+    for path in sources:
+        for i in range(per_source):
+            # A distinct colour per page so every pixel buffer is really written
+            render = Image.new("RGB", LETTER_AT_40_DPI, (i % 251, 80, 160))
+            if model == "legacy":
+                fname = os.path.basename(path)
+                short_name = (fname[:10] + '..') if len(fname) > 10 else fname
+                keep.append(LegacyPageData(path, i, render, f"{short_name}\nPg {i+1}"))
+            else:
+                keep.append(pdf_engine.PageData(path, i, render))
+            del render
+    return (rss_bytes() - before) / len(keep)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=5000)
+    parser.add_argument("--model", choices=["legacy", "compact"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.model:
+        print(measure(args.model, args.pages))
+        return
+
+    print(f"{args.pages} pages")
+    for model in ["legacy", "compact"]:
+        out = subprocess.run([sys.executable, __file__, "--pages", str(args.pages), "--model", model],
+                             check=True, capture_output=True, text=True).stdout
+        per_page = float(out)
+        print(f"{model:>8}: {per_page / 1024:8.1f} KiB/page  ({per_page * args.pages / 2**20:7.1f} MiB total)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Compares the old per-page PdfReader save loop with SourcePool on synthetic PDFs.
+
+Usage: python benchmarks/bench_save.py [--sources 3] [--pages 700]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+from pdf_engine import SourcePool
+
+def make_synthetic_pdf(path, page_count):
+    """Writes a PDF with one small text content stream per page and a shared font."""
+    writer = PdfWriter()
+    font = DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    })
+    font_ref = writer._add_object(font)
+    for i in range(page_count):
+        writer.add_blank_page(width=612, height=792)
+        page = writer.pages[-1] # add_blank_page returns the page before it is cloned into the writer
+        content = DecodedStreamObject()
+        content.set_data(f"BT /F1 24 Tf 72 700 Td (Page {i + 1}) Tj ET".encode())
+        page[NameObject("/Contents")] = writer._add_object(content)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font_ref})
+        })
+    with open(path, "wb") as f:
+        writer.write(f)
+
+def save_legacy(pages, output_path):
+    """The save loop before SourcePool: a fresh PdfReader for every page."""
+    writer = PdfWriter()
+    open_files = {}
+    for src, idx in pages:
+        if src not in open_files:
+            open_files[src] = open(src, 'rb')
+        r = PdfReader(open_files[src])
+        writer.add_page(r.pages[idx])
+    with open(output_path, "wb") as f_out:
+        writer.write(f_out)
+    for f in open_files.values():
+        f.close()
+
+def save_pooled(pages, output_path):
+    writer = PdfWriter()
+    with SourcePool() as pool:
+        for src, idx in pages:
+            writer.add_page(pool.get_page(src, idx))
+        with open(output_path, "wb") as f_out:
+            writer.write(f_out)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sources", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=700, help="pages per source")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sources = []
+        for n in range(args.sources):
+            path = os.path.join(tmp, f"source_{n}.pdf")
+            make_synthetic_pdf(path, args.pages)
+            sources.append(path)
+        pages = [(src, i) for src in sources for i in range(args.pages)]
+
+        print(f"{len(pages)} pages from {len(sources)} sources")
+        for name, fn in [("legacy", save_legacy), ("pooled", save_pooled)]:
+            out = os.path.join(tmp, f"out_{name}.pdf")
+            start = time.perf_counter()
+            fn(pages, out)
+            elapsed = time.perf_counter() - start
+            print(f"{name:>8}: {elapsed:8.2f} s  ({os.path.getsize(out) / 1024:.0f} KiB)")
+
+if __name__ == "__main__":
+    main()
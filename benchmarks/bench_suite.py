@@ -0,0 +1,252 @@
+"""Throughput of ingest, grid refresh, reorder, delete and save on synthetic PDFs.
+
+Every case builds its PDFs from a fixed seed, so runs on one machine are comparable. The grid
+benchmark needs a display; on a headless Linux box run the suite under Xvfb:
+
+    xvfb-run -a python benchmarks/bench_suite.py [--scale 0.25] [--json out.json] [--baseline old.json]
+
+Without a display the grid benchmark is skipped, and without Poppler (pdftoppm) so is rasterizing.
+With --baseline, results more than --tolerance worse than the baseline fail the run (exit 1).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+from PyPDF2 import PdfWriter
+from PyPDF2.generic import (ArrayObject, DecodedStreamObject, DictionaryObject, EncodedStreamObject, NameObject,
+                            NumberObject)
+
+from pdf_engine import (PROFILER, THUMB_SIZE, PageData, PageList, SourceRegistry, plan_shards, rasterize_shards,
+                        write_pdf)
+
+PAGE_SIZES = {"letter": (612, 792), "a4": (595, 842), "a3": (842, 1191)}
+
+# name -> (sources, pages per source, page size, images per page, image pixels)
+CASES = {
+    "text": (4, 500, "letter", 0, None),
+    "scans": (2, 150, "a4", 1, (620, 877)),
+    "dense": (1, 200, "a3", 8, (160, 120)),
+}
+
+GRID_SCROLL_STEPS = 40
+REORDER_OPS = 200
+DELETE_OPS = 200
+
+def make_image(writer, size, rng):
+    """Adds a Flate-compressed RGB image XObject: a gradient with a random tint, distinct per call."""
+    gradient = Image.linear_gradient("L").resize(size)
+    tint = [gradient.point(lambda v, k=rng.randrange(1, 4), c=rng.randrange(256): (v * k + c) % 256)
+            for _ in range(3)]
+    image = EncodedStreamObject()
+    image.update({
+        NameObject("/Type"): NameObject("/XObject"),
+        NameObject("/Subtype"): NameObject("/Image"),
+        NameObject("/Width"): NumberObject(size[0]),
+        NameObject("/Height"): NumberObject(size[1]),
+        NameObject("/ColorSpace"): NameObject("/DeviceRGB"),
+        NameObject("/BitsPerComponent"): NumberObject(8),
+        NameObject("/Filter"): NameObject("/FlateDecode"),
+    })
+    image._data = zlib.compress(Image.merge("RGB", tint).tobytes(), 6)
+    return writer._add_object(image)
+
+def make_pdf(path, page_count, size="letter", images=0, image_px=None, seed=0):
+    """Writes a PDF of `page_count` pages with a text line and `images` images each, all from `seed`."""
+    rng = random.Random(seed)
+    width, height = PAGE_SIZES[size]
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    }))
+    cols = max(1, round(images ** 0.5))
+    for i in range(page_count):
+        writer.add_blank_page(width=width, height=height)
+        page = writer.pages[-1]
+        ops = [f"BT /F1 24 Tf 72 {height - 72} Td (Page {i + 1} of {os.path.basename(path)}) Tj ET"]
+        xobjects = DictionaryObject()
+        cell_w = (width - 144) / cols
+        for n in range(images):
+            name = NameObject(f"/Im{n}")
+            xobjects[name] = make_image(writer, image_px, rng)
+            row, col = divmod(n, cols)
+            w = cell_w - 10
+            h = w * image_px[1] / image_px[0]
+            ops.append(f"q {w:.1f} 0 0 {h:.1f} {72 + col * cell_w:.1f} {height - 120 - (row + 1) * (h + 10):.1f} cm {name} Do Q")
+        content = DecodedStreamObject()
+        content.set_data("\n".join(ops).encode())
+        page[NameObject("/Contents")] = writer._add_object(content)
+        resources = DictionaryObject({NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})})
+        if images: resources[NameObject("/XObject")] = xobjects
+        page[NameObject("/Resources")] = resources
+        page[NameObject("/MediaBox")] = ArrayObject([NumberObject(0), NumberObject(0), NumberObject(width), NumberObject(height)])
+    with open(path, "wb") as f:
+        writer.write(f)
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+# --- Benchmarks ---
+# Each returns [(bench, value, unit, higher_is_better)]; a value of None means skipped.
+
+def bench_ingest(paths, workers):
+    sources = SourceRegistry()
+    secs, counts = timed(lambda: [(p, sources.get(p).page_count) for p in paths])
+    sources.close_all()
+    total = sum(count for _, count in counts)
+    results = [("ingest parse", total / secs, "pages/s", True)]
+    if shutil.which("pdftoppm") is None:
+        return results + [("ingest render", None, "pages/s (no pdftoppm)", True)]
+    shards = plan_shards(counts)
+    secs, rendered = timed(lambda: sum(len(images) for _, images, error in rasterize_shards(counts, shards, workers)
+                                       if error is None))
+    return results + [("ingest render", rendered / secs, "pages/s", True)]
+
+def bench_grid(pages):
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception:
+        return [(bench, None, unit + " (no display)", False)
+                for bench, unit in [("grid refresh", "ms"), ("grid edit refresh", "ms"), ("grid scroll", "ms/step")]]
+    from pdf_deleter import ThumbnailGrid
+    try:
+        root.geometry("900x700")
+        noop = lambda *args: None
+        grid = ThumbnailGrid(root, lambda: pages, lambda i: False, noop, noop, noop)
+        grid.pack(fill=tk.BOTH, expand=True)
+        root.update()
+
+        def refresh():
+            grid.refresh()
+            root.update()
+        cold, _ = timed(refresh) # Builds the widgets and PhotoImages in view
+
+        def scroll():
+            for step in range(1, GRID_SCROLL_STEPS + 1):
+                grid.canvas.yview_moveto(step / GRID_SCROLL_STEPS)
+                root.update()
+        scroll_secs, _ = timed(scroll)
+
+        grid.canvas.yview_moveto(0)
+        root.update()
+        del pages[0]
+        edit, _ = timed(refresh) # After an edit: the visible pages shift by one cell
+        return [("grid refresh", cold * 1000, "ms", False), ("grid edit refresh", edit * 1000, "ms", False),
+                ("grid scroll", scroll_secs * 1000 / GRID_SCROLL_STEPS, "ms/step", False)]
+    finally:
+        root.destroy()
+
+def bench_edits(paths, seed):
+    rng = random.Random(seed)
+    doc = PageList()
+    for path in paths: doc.append(doc.open_file(path))
+    n = len(doc)
+
+    def reorder():
+        for _ in range(REORDER_OPS):
+            start = rng.randrange(n)
+            blocks = [(start, min(n, start + rng.randrange(1, 20)))]
+            doc.move_block(blocks, rng.randrange(n + 1))
+    reorder_secs, _ = timed(reorder)
+    undo_secs, _ = timed(lambda: [doc.undo() for _ in range(REORDER_OPS)])
+
+    deletes = min(DELETE_OPS, n // 2)
+    def delete():
+        for _ in range(deletes):
+            at = rng.randrange(len(doc))
+            doc.delete([(at, at + 1)])
+    delete_secs, _ = timed(delete)
+    spec_secs, removed = timed(lambda: doc.delete(doc.select("every 3rd page")))
+    return [("reorder", REORDER_OPS / reorder_secs, "moves/s", True),
+            ("undo", REORDER_OPS / undo_secs, "undos/s", True),
+            ("delete", deletes / delete_secs, "deletes/s", True),
+            ("delete every 3rd", len(removed) / spec_secs, "pages/s", True)]
+
+def bench_save(paths, tmp):
+    sources = SourceRegistry()
+    pages = [(p, i) for p in paths for i in range(sources.get(p).page_count)]
+    out = os.path.join(tmp, "saved.pdf")
+    secs, _ = timed(lambda: write_pdf(pages, out, sources))
+    sources.close_all()
+    return [("save", len(pages) / secs, "pages/s", True),
+            ("save bytes", os.path.getsize(out) / secs / 2**20, "MiB/s", True)]
+
+def run_case(name, spec, scale, workers, seed, tmp):
+    sources, per_source, size, images, image_px = spec
+    per_source = max(1, round(per_source * scale))
+    paths = []
+    for n in range(sources):
+        path = os.path.join(tmp, f"{name}_{n}.pdf")
+        make_pdf(path, per_source, size, images, image_px, seed=seed + n)
+        paths.append(path)
+
+    # The grid shows stand-in thumbnails, so it runs without Poppler
+    colours = random.Random(seed)
+    grid_pages = [PageData(p, i, Image.new("RGB", THUMB_SIZE, tuple(colours.randrange(256) for _ in range(3))))
+                  for p in paths for i in range(per_source)]
+    results = bench_ingest(paths, workers) + bench_grid(list(grid_pages)) + bench_edits(paths, seed) + bench_save(paths, tmp)
+    for page in grid_pages: page.image = None
+    return [{"case": name, "pages": sources * per_source, "bench": bench, "value": value, "unit": unit,
+             "higher_is_better": higher} for bench, value, unit, higher in results]
+
+def compare(results, baseline_path, tolerance):
+    """Prints results worse than the baseline by more than `tolerance`; returns how many there were."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["case"], r["bench"]): r for r in json.load(f)["results"]}
+    regressions = 0
+    for r in results:
+        old = baseline.get((r["case"], r["bench"]))
+        if r["value"] is None or not old or not old["value"]: continue
+        ratio = r["value"] / old["value"]
+        worse = ratio < 1 - tolerance if r["higher_is_better"] else ratio > 1 + tolerance
+        if worse:
+            regressions += 1
+            print(f"REGRESSION {r['case']}/{r['bench']}: {old['value']:.1f} -> {r['value']:.1f} {r['unit']}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cases", default=",".join(CASES), help=f"comma-separated subset of {', '.join(CASES)}")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies every case's page count")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="rasterizer processes")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", metavar="PATH", help="write results and the stage profile to PATH")
+    parser.add_argument("--baseline", metavar="PATH", help="results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown against the baseline (default: 0.2)")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.cases.split(","):
+            if name not in CASES: parser.error(f"unknown case {name!r}")
+            case = run_case(name, CASES[name], args.scale, args.workers, args.seed, tmp)
+            print(f"{name} ({case[0]['pages']} pages)")
+            for r in case:
+                value = "skipped" if r["value"] is None else f"{r['value']:10.1f}"
+                print(f"  {r['bench']:>18}: {value:>10} {r['unit']}")
+            results.extend(case)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"python": platform.python_version(), "platform": platform.platform(), "args": vars(args),
+                       "results": results, "profile": PROFILER.snapshot()}, f, indent=2)
+    print(f"stages: {PROFILER.summary(limit=8)}")
+    if args.baseline and compare(results, args.baseline, args.tolerance): return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
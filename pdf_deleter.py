@@ -1,11 +1,16 @@
 
 import tkinter as tk
-from tkinter import filedialog
-from PyPDF2 import PdfReader, PdfWriter
+from tkinter import filedialog, messagebox
 import os
 import math
-from pdf2image import convert_from_path
+import queue
+from collections import OrderedDict
 from PIL import Image, ImageTk
+from pdf_engine import (PageData, PageList, SourceRegistry, ThumbnailCache, IngestJob, INGEST_WORKERS,
+                        RenderScheduler, ResidentThumbnails, SaveJob, SaveCancelled, SaveReport, RangeSet,
+                        PageAnalysis, ranges_from_indices, PROJECT_SUFFIX, ProjectError, save_project, load_project,
+                        TileRenderer, TILE_SIZE, PREVIEW_MAX_DPI, page_pixel_size,
+                        SPLIT_NAME, SplitJob, groups_every, groups_by_source, split_outputs, PROFILER)
 
 # --- Custom UI Components ---
 
@@ -88,23 +93,99 @@ class MessageBanner(tk.Frame):
         if self.message_frame: self.message_frame.destroy()
         self.config(height=0) # Collapse
 
-# --- Core Data Class ---
+class ProgressIndicator(tk.Frame):
+    """Status text, progress bar and Cancel button for background work. Hidden while idle."""
+    def __init__(self, parent, bar_width=160, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.config(bg=parent.cget('bg'))
+        self.bar_width = bar_width
+        
+        self.label = tk.Label(self, text="", font=("Segoe UI", 9), bg=self.cget('bg'), fg="#666")
+        self.label.pack(side=tk.LEFT, padx=(0, 8))
+        
+        self.bar = tk.Canvas(self, width=bar_width, height=10, bg="#dcdcdc", highlightthickness=0)
+        self.bar.pack(side=tk.LEFT)
+        self.fill = self.bar.create_rectangle(0, 0, 0, 10, fill="#4A90E2", outline="")
+        
+        self.cancel_btn = RoundedButton(self, "Cancel", None, bg="#e53935", hover_bg="#c62828",
+                                        width=70, height=24, font=("Segoe UI", 9, "bold"))
+        self.cancel_btn.pack(side=tk.LEFT, padx=8)
+    
+    def start(self, text, cancel_command):
+        self.cancel_btn.command = cancel_command
+        self.cancel_btn.set_enabled(True)
+        self.update_progress(0, 0, text)
+        self.pack(side=tk.LEFT, padx=20)
+    
+    def update_progress(self, done, total, text=None):
+        if text is not None: self.label.config(text=text)
+        frac = done / total if total else 0
+        self.bar.coords(self.fill, 0, 0, int(self.bar_width * frac), 10)
+    
+    def set_cancelling(self):
+        self.cancel_btn.set_enabled(False)
+        self.label.config(text="Cancelling...")
+    
+    def stop(self):
+        self.pack_forget()
 
-class PageData:
-    """Stores information about a specific page from a specific file."""
-    def __init__(self, source_path, page_index, image, display_index_str):
-        self.source_path = source_path
-        self.page_index = page_index # 0-based index in original file
-        self.image = image
-        self.display_index_str = display_index_str # e.g. "Doc1 - Pg 1"
-        self.id = f"{source_path}_{page_index}" # Unique ID
+class SplitDialog(tk.Toplevel):
+    """Modal choice of how to split the pages into many PDFs. `result` is (mode, every, name) or None."""
+    def __init__(self, parent, has_selection):
+        super().__init__(parent, bg="white", padx=20, pady=15)
+        self.title("Split Export")
+        self.transient(parent)
+        self.resizable(False, False)
+        self.result = None
+        
+        self.mode = tk.StringVar(value="every")
+        self.every = tk.StringVar(value="10")
+        self.name = tk.StringVar(value=SPLIT_NAME)
+        font = ("Segoe UI", 10)
+        
+        row = tk.Frame(self, bg="white")
+        row.pack(anchor="w")
+        tk.Radiobutton(row, text="Every", variable=self.mode, value="every", bg="white", font=font).pack(side=tk.LEFT)
+        tk.Entry(row, textvariable=self.every, width=5, font=font, bd=1, relief=tk.SOLID).pack(side=tk.LEFT, padx=4)
+        tk.Label(row, text="pages", bg="white", font=font).pack(side=tk.LEFT)
+        tk.Radiobutton(self, text="At each source file boundary", variable=self.mode, value="files",
+                       bg="white", font=font).pack(anchor="w")
+        tk.Radiobutton(self, text="Each run of selected pages", variable=self.mode, value="selection", bg="white",
+                       font=font, state=tk.NORMAL if has_selection else tk.DISABLED).pack(anchor="w")
+        
+        tk.Label(self, text="File names ({n}, {source}, {first}, {last}):", bg="white", fg="#666",
+                 font=("Segoe UI", 9)).pack(anchor="w", pady=(10, 0))
+        tk.Entry(self, textvariable=self.name, width=36, font=font, bd=1, relief=tk.SOLID).pack(anchor="w", ipady=3)
+        
+        buttons = tk.Frame(self, bg="white")
+        buttons.pack(fill=tk.X, pady=(12, 0))
+        RoundedButton(buttons, "Cancel", self.destroy, width=80, height=30, bg="#95a5a6").pack(side=tk.RIGHT)
+        RoundedButton(buttons, "Choose Folder...", self.accept, width=130, height=30, bg="#27ae60").pack(side=tk.RIGHT, padx=8)
+        self.bind("<Return>", lambda e: self.accept())
+        self.bind("<Escape>", lambda e: self.destroy())
+        self.wait_visibility() # On X11 a grab fails until the window is mapped
+        self.grab_set()
+
+    def accept(self):
+        every = None
+        if self.mode.get() == "every":
+            try:
+                every = int(self.every.get())
+                if every < 1: raise ValueError
+            except ValueError:
+                messagebox.showerror("Split Export", "Pages per file must be a whole number of at least 1", parent=self)
+                return
+        self.result = (self.mode.get(), every, self.name.get().strip() or SPLIT_NAME)
+        self.destroy()
 
 # --- Draggable Thumbnail Widget ---
 
 class DraggableThumbnail(tk.Frame):
-    def __init__(self, parent, page_data, selection_callback, drag_start_callback, drag_end_callback, **kwargs):
+    """A recyclable grid cell; bind_page points it at a PageData and its position in pages_data."""
+    def __init__(self, parent, selection_callback, drag_start_callback, drag_end_callback, **kwargs):
         super().__init__(parent, **kwargs)
-        self.page_data = page_data
+        self.page_data = None
+        self.index = None # Position in pages_data while bound
         self.selection_callback = selection_callback
         self.drag_start_callback = drag_start_callback
         self.drag_end_callback = drag_end_callback
@@ -121,12 +202,10 @@ class DraggableThumbnail(tk.Frame):
                                highlightthickness=0, bd=0)
         self.canvas.pack()
         
-        # Set Image
-        self.photo = ImageTk.PhotoImage(page_data.image.resize((100, 130)))
-        self.canvas.create_image(50, 65, image=self.photo)
+        self.photo = None
         
         # Label
-        self.lbl = tk.Label(self.inner, text=page_data.display_index_str, 
+        self.lbl = tk.Label(self.inner, text="", 
                            font=("Segoe UI", 8), bg="white", fg="#666")
         self.lbl.pack(pady=(4,0))
         
@@ -140,6 +219,28 @@ class DraggableThumbnail(tk.Frame):
         self._start_x = 0
         self._start_y = 0
 
+    def bind_page(self, page_data, index, selected, photo):
+        self.page_data = page_data
+        self.index = index
+        self.lbl.config(text=page_data.display_index_str)
+        self.set_photo(photo)
+        if selected != self.is_selected: self.set_selected(selected)
+
+    def unbind_page(self):
+        self.page_data = None
+        self.index = None
+        self.canvas.delete("all")
+        self.photo = None
+
+    def set_photo(self, photo):
+        self.canvas.delete("all")
+        self.photo = photo
+        if photo is None:
+            # Placeholder until the ingest worker delivers the thumbnail
+            self.canvas.create_text(50, 65, text="...", fill="#999", font=("Segoe UI", 14))
+        else:
+            self.canvas.create_image(50, 65, image=photo)
+
     def set_selected(self, selected):
         self.is_selected = selected
         color = "#ffcccc" if selected else "white"
@@ -156,7 +257,7 @@ class DraggableThumbnail(tk.Frame):
         self._start_x = event.x
         self._start_y = event.y
         # Immediate visual feedback for selection
-        self.selection_callback(self, event.state & 0x0004) # Check for Ctrl key
+        self.selection_callback(self, event.state & 0x0004, event.state & 0x0001) # Ctrl, Shift
 
     def on_drag_motion(self, event):
         # Threshold to detect drag vs click
@@ -169,28 +270,420 @@ class DraggableThumbnail(tk.Frame):
             pass 
 
     def on_drag_release(self, event):
-        if self._drag_started:
-            self.drag_end_callback(event)
-            self._drag_started = False
+        self.drag_end_callback(event, self._drag_started)
+        self._drag_started = False
+
+# --- Virtualized Grid ---
+
+GRID_COLUMNS = 6
+GRID_PAD = 10 # Space around each thumbnail, like grid(padx=10, pady=10)
+GRID_BUFFER_ROWS = 2 # Rows kept bound above and below the viewport
+GRID_PHOTO_CACHE = 512 # PhotoImages kept for pages that scrolled out of view
+RENDER_PREFETCH_ROWS = 4 # Rows beyond the bound grid rows that are rendered ahead of scrolling
+AUTOSCROLL_MARGIN = 40 # Pixels from the canvas top/bottom edge where a drag starts scrolling
+AUTOSCROLL_MAX_STEP = 30 # Pixels scrolled per drag tick with the pointer at the very edge
+
+class ThumbnailGrid(tk.Frame):
+    """Scrolled grid of page thumbnails that only builds widgets for the rows in view.
+
+    Widgets are kept per page: after any change to the page list, `refresh` reconciles the pages in
+    the viewport (plus GRID_BUFFER_ROWS) against the widgets already showing them. Surviving pages
+    keep their widget and PhotoImage and are only moved if their cell changed; widgets of pages that
+    left the viewport are recycled for the ones that entered it. The scrollregion is computed from
+    the page count and the fixed cell size, so the cost of an edit depends on the viewport, not on
+    the document length.
+    """
+    def __init__(self, parent, get_pages, is_selected, selection_callback, drag_start_callback, drag_end_callback,
+                 viewport_callback=None, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.config(bg=parent.cget('bg'))
+        self.get_pages = get_pages # Returns the ordered PageData list
+        self.is_selected = is_selected # index -> bool
+        self.viewport_callback = viewport_callback # Called with (start, stop) of the bound pages
+        self.callbacks = (selection_callback, drag_start_callback, drag_end_callback)
+        
+        self.canvas = tk.Canvas(self, bg="#e0e0e0", highlightthickness=0)
+        self.scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=self.on_scrolled)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.bind("<Configure>", lambda e: self.update_viewport())
+        
+        self.windows = {} # DraggableThumbnail -> canvas window id
+        self.free = [] # Pooled widgets not showing a page (hidden)
+        self.bound = {} # PageData -> widget currently showing it
+        self.photos = OrderedDict() # PageData -> PhotoImage, least recently used first
+        self.drop_marker = None # Canvas line showing where a drag would drop
+        self.cell_w, self.cell_h = self.measure_cell()
+
+    def measure_cell(self):
+        # Measure a selected (thicker border) cell with a two line label once; every cell has this size
+        probe = DraggableThumbnail(self.canvas, *self.callbacks)
+        probe.lbl.config(text="\n")
+        probe.set_selected(True)
+        probe.update_idletasks()
+        w, h = probe.winfo_reqwidth(), probe.winfo_reqheight()
+        probe.destroy()
+        return w + 2 * GRID_PAD, h + 2 * GRID_PAD
+
+    def on_scrolled(self, first, last):
+        # Every view change (scrollbar, mousewheel, resize) ends up here
+        self.scrollbar.set(first, last)
+        self.update_viewport()
+
+    def refresh(self):
+        """Call after pages were added, removed or reordered."""
+        rows = math.ceil(len(self.get_pages()) / GRID_COLUMNS)
+        self.canvas.configure(scrollregion=(0, 0, GRID_COLUMNS * self.cell_w, rows * self.cell_h))
+        self.update_viewport()
+
+    def visible_range(self):
+        top = self.canvas.canvasy(0)
+        height = max(self.canvas.winfo_height(), self.cell_h)
+        first_row = max(0, int(top // self.cell_h) - GRID_BUFFER_ROWS)
+        last_row = int((top + height) // self.cell_h) + GRID_BUFFER_ROWS
+        count = len(self.get_pages())
+        return min(count, first_row * GRID_COLUMNS), min(count, (last_row + 1) * GRID_COLUMNS)
+
+    def update_viewport(self):
+        pages = self.get_pages()
+        start, stop = self.visible_range()
+        visible = pages[start:stop]
+        
+        # Release widgets whose page is no longer in view (scrolled away or deleted)
+        wanted = set(visible)
+        for page in [p for p in self.bound if p not in wanted]:
+            widget = self.bound.pop(page)
+            widget.unbind_page()
+            self.canvas.itemconfigure(self.windows[widget], state="hidden")
+            self.free.append(widget)
+        
+        for index, page in enumerate(visible, start):
+            selected = self.is_selected(index)
+            widget = self.bound.get(page)
+            if widget is None:
+                widget = self.take_widget()
+                widget.bind_page(page, index, selected, self.photo_for(page))
+                self.bound[page] = widget
+                self.place_widget(widget, index)
+            else:
+                if widget.index != index:
+                    widget.index = index
+                    self.place_widget(widget, index)
+                if widget.is_selected != selected: widget.set_selected(selected)
+        
+        if self.viewport_callback: self.viewport_callback(start, stop)
+
+    def take_widget(self):
+        if self.free: return self.free.pop()
+        widget = DraggableThumbnail(self.canvas, *self.callbacks)
+        self.windows[widget] = self.canvas.create_window(0, 0, window=widget, anchor="center", state="hidden")
+        return widget
+
+    def place_widget(self, widget, index):
+        row, col = divmod(index, GRID_COLUMNS)
+        window = self.windows[widget]
+        self.canvas.coords(window, (col + 0.5) * self.cell_w, (row + 0.5) * self.cell_h)
+        self.canvas.itemconfigure(window, state="normal")
+
+    def photo_for(self, page):
+        if not page.has_image: return None
+        photo = self.photos.get(page)
+        if photo is None:
+            with PROFILER.stage("photo"):
+                photo = ImageTk.PhotoImage(page.image)
+            self.photos[page] = photo
+            if len(self.photos) > GRID_PHOTO_CACHE: self.photos.popitem(last=False)
+        else:
+            self.photos.move_to_end(page)
+        return photo
+
+    def update_image(self, page):
+        """Call after page.image changed."""
+        self.photos.pop(page, None)
+        widget = self.bound.get(page)
+        if widget: widget.set_photo(self.photo_for(page))
+
+    def forget_pages(self, pages):
+        """Drops cached PhotoImages of pages that left the document."""
+        for page in pages: self.photos.pop(page, None)
+
+    def widget_for_index(self, index):
+        pages = self.get_pages()
+        if not 0 <= index < len(pages): return None
+        widget = self.bound.get(pages[index])
+        return widget if widget is not None and widget.index == index else None
+
+    def drop_gap(self, x_root, y_root):
+        """The gap (0 to len) nearest to a screen point, from the scroll offset and the cell size alone."""
+        x = self.canvas.canvasx(x_root - self.canvas.winfo_rootx())
+        y = self.canvas.canvasy(y_root - self.canvas.winfo_rooty())
+        row = max(0, int(y // self.cell_h))
+        col = min(GRID_COLUMNS, max(0, round(x / self.cell_w))) # Nearest cell boundary
+        return min(len(self.get_pages()), row * GRID_COLUMNS + col)
+
+    def show_drop_marker(self, gap):
+        row, col = divmod(gap, GRID_COLUMNS)
+        if col == 0 and gap and gap == len(self.get_pages()): row, col = row - 1, GRID_COLUMNS # After the last page
+        x, top = col * self.cell_w, row * self.cell_h + GRID_PAD
+        coords = (x, top, x, top + self.cell_h - 2 * GRID_PAD)
+        if self.drop_marker is None:
+            self.drop_marker = self.canvas.create_line(*coords, fill="#4A90E2", width=4)
+        else:
+            self.canvas.coords(self.drop_marker, *coords)
+
+    def hide_drop_marker(self):
+        if self.drop_marker is not None:
+            self.canvas.delete(self.drop_marker)
+            self.drop_marker = None
+
+    def autoscroll(self, y_root):
+        """Scrolls when `y_root` is within AUTOSCROLL_MARGIN of the canvas edges, faster nearer the edge."""
+        y = y_root - self.canvas.winfo_rooty()
+        height = self.canvas.winfo_height()
+        if y < AUTOSCROLL_MARGIN:
+            depth = AUTOSCROLL_MARGIN - y
+        elif y > height - AUTOSCROLL_MARGIN:
+            depth = height - AUTOSCROLL_MARGIN - y
+        else:
+            return
+        step = max(-AUTOSCROLL_MAX_STEP, min(AUTOSCROLL_MAX_STEP, depth * AUTOSCROLL_MAX_STEP // AUTOSCROLL_MARGIN))
+        total = math.ceil(len(self.get_pages()) / GRID_COLUMNS) * self.cell_h
+        if total > height: self.canvas.yview_moveto(max(0, self.canvas.canvasy(0) - step) / total)
+
+    def scroll_to_index(self, index):
+        total = math.ceil(len(self.get_pages()) / GRID_COLUMNS) * self.cell_h
+        if total: self.canvas.yview_moveto((index // GRID_COLUMNS) * self.cell_h / total)
+
+    def widget_for_page(self, page):
+        return self.bound.get(page)
+
+    def visible_widgets(self):
+        return list(self.bound.values())
+
+# --- Preview Pane ---
+
+PREVIEW_ZOOM_STEP = 1.25
+PREVIEW_MIN_DPI = 10
+
+class PreviewPane(tk.Frame):
+    """Zoomable, pannable view of one page, drawn from tiles rendered for the visible area only.
+
+    Tiles come from a TileRenderer at the current zoom's DPI. Until a tile arrives, the matching
+    part of the page thumbnail is shown scaled up in its place, so zooming and panning never show
+    holes. Only the visible tiles have PhotoImages.
+    """
+    def __init__(self, parent, tiles, **kwargs):
+        super().__init__(parent, bg="white", **kwargs)
+        self.tiles = tiles
+        self.page = None
+        self.page_size = None # Points, rotation applied
+        self.dpi = None
+        self.items = {} # (col, row) -> (canvas item, PhotoImage, final)
+        
+        header = tk.Frame(self, bg="white")
+        header.pack(fill=tk.X, padx=8, pady=6)
+        self.title = tk.Label(header, text="Preview", bg="white", fg="#666", font=("Segoe UI", 10, "bold"))
+        self.title.pack(side=tk.LEFT)
+        for text, command in [("Fit", self.fit), ("+", lambda: self.zoom(PREVIEW_ZOOM_STEP)),
+                              ("-", lambda: self.zoom(1 / PREVIEW_ZOOM_STEP))]:
+            RoundedButton(header, text, command, width=36, height=26, bg="#95a5a6").pack(side=tk.RIGHT, padx=2)
+        self.zoom_label = tk.Label(header, text="", bg="white", fg="#666", font=("Segoe UI", 9))
+        self.zoom_label.pack(side=tk.RIGHT, padx=6)
+        
+        body = tk.Frame(self, bg="white")
+        body.pack(fill=tk.BOTH, expand=True)
+        self.canvas = tk.Canvas(body, bg="#bdc3c7", highlightthickness=0)
+        ybar = tk.Scrollbar(body, orient=tk.VERTICAL, command=self.canvas.yview)
+        xbar = tk.Scrollbar(self, orient=tk.HORIZONTAL, command=self.canvas.xview)
+        self.canvas.configure(yscrollcommand=lambda *a: (ybar.set(*a), self.update_view()),
+                              xscrollcommand=lambda *a: (xbar.set(*a), self.update_view()))
+        ybar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        xbar.pack(fill=tk.X)
+        
+        self.canvas.bind("<Configure>", lambda e: self.update_view())
+        self.canvas.bind("<ButtonPress-1>", lambda e: self.canvas.scan_mark(e.x, e.y))
+        self.canvas.bind("<B1-Motion>", lambda e: self.canvas.scan_dragto(e.x, e.y, gain=1))
+        self.canvas.bind("<Control-MouseWheel>", self.on_zoom_wheel)
+        self.canvas.bind("<MouseWheel>", self.on_wheel) # Keeps the app-wide grid scrolling out of here
+        self.after(WORKER_POLL_MS, self.poll)
+
+    def show_page(self, page):
+        # The source may not be parsed yet, so its page size is looked up on the tile worker
+        if page is self.page: return
+        self.clear()
+        self.page = page
+        self.title.config(text=page.display_index_str.replace("\n", "  "))
+        self.tiles.request_size(page.source_path, page.page_index)
+
+    def clear(self):
+        self.page = self.page_size = self.dpi = None
+        self.clear_items()
+        self.tiles.request([])
+        self.canvas.configure(scrollregion=(0, 0, 0, 0))
+        self.title.config(text="Preview")
+        self.zoom_label.config(text="")
+
+    def fit(self):
+        if self.page_size is None: return
+        width = max(self.canvas.winfo_width(), 50)
+        self.set_dpi(width * 72 / self.page_size[0])
+
+    def zoom(self, factor, x=None, y=None):
+        if self.dpi is not None: self.set_dpi(self.dpi * factor, x, y)
+
+    def on_zoom_wheel(self, event):
+        self.zoom(PREVIEW_ZOOM_STEP if event.delta > 0 else 1 / PREVIEW_ZOOM_STEP, event.x, event.y)
+        return "break"
+
+    def on_wheel(self, event):
+        self.canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
+        return "break"
+
+    def set_dpi(self, dpi, x=None, y=None):
+        """Changes the zoom, keeping the page point under view position (x, y) (default: centre) in place."""
+        dpi = int(max(PREVIEW_MIN_DPI, min(PREVIEW_MAX_DPI, dpi)))
+        if dpi == self.dpi: return
+        if x is None: x, y = self.canvas.winfo_width() / 2, self.canvas.winfo_height() / 2
+        # The page point under (x, y) as a fraction of the page, before the zoom changes
+        if self.dpi:
+            old_w, old_h = page_pixel_size(self.page_size, self.dpi)
+            fx, fy = self.canvas.canvasx(x) / old_w, self.canvas.canvasy(y) / old_h
+        else:
+            fx = fy = 0
+        
+        self.dpi = dpi
+        self.clear_items()
+        width, height = page_pixel_size(self.page_size, dpi)
+        self.canvas.configure(scrollregion=(0, 0, width, height))
+        self.canvas.xview_moveto(max(0, (fx * width - x) / width))
+        self.canvas.yview_moveto(max(0, (fy * height - y) / height))
+        self.zoom_label.config(text=f"{dpi} dpi")
+        self.update_view()
+
+    def clear_items(self):
+        for item, _, _ in self.items.values(): self.canvas.delete(item)
+        self.items.clear()
+
+    def tile_key(self, col, row):
+        return (self.page.source_path, self.page.page_index, self.dpi, col, row)
+
+    def tile_box(self, col, row):
+        width, height = page_pixel_size(self.page_size, self.dpi)
+        return (col * TILE_SIZE, row * TILE_SIZE, min(width, (col + 1) * TILE_SIZE), min(height, (row + 1) * TILE_SIZE))
+
+    def update_view(self):
+        if self.page is None or self.dpi is None: return
+        width, height = page_pixel_size(self.page_size, self.dpi)
+        x0, y0 = max(0, self.canvas.canvasx(0)), max(0, self.canvas.canvasy(0))
+        x1 = min(width, self.canvas.canvasx(self.canvas.winfo_width()))
+        y1 = min(height, self.canvas.canvasy(self.canvas.winfo_height()))
+        visible = [(col, row) for row in range(int(y0 // TILE_SIZE), int(max(y0, y1 - 1) // TILE_SIZE) + 1)
+                   for col in range(int(x0 // TILE_SIZE), int(max(x0, x1 - 1) // TILE_SIZE) + 1)]
+        
+        # Tiles that scrolled away give back their PhotoImage; the rendered tile stays in the LRU
+        wanted = set(visible)
+        for cell in [c for c in self.items if c not in wanted]:
+            self.canvas.delete(self.items.pop(cell)[0])
+        
+        missing = []
+        for col, row in visible:
+            current = self.items.get((col, row))
+            if current and current[2]: continue
+            tile = self.tiles.get(self.tile_key(col, row))
+            if tile is None:
+                missing.append((col, row))
+                if current is None: self.show_tile(col, row, self.placeholder(col, row), False)
+            else:
+                self.show_tile(col, row, tile, True)
+        
+        # Render from the middle of the view outwards
+        cx, cy = (x0 + x1) / 2 / TILE_SIZE, (y0 + y1) / 2 / TILE_SIZE
+        missing.sort(key=lambda c: (c[0] + 0.5 - cx) ** 2 + (c[1] + 0.5 - cy) ** 2)
+        self.tiles.request([self.tile_key(col, row) for col, row in missing])
+
+    def placeholder(self, col, row):
+        # The same area of the thumbnail, scaled up: blurry, but in the right place at once
+        box = self.tile_box(col, row)
+        size = (box[2] - box[0], box[3] - box[1])
+        thumb = self.page.image
+        if thumb is None: return Image.new("RGB", size, "white")
+        width, height = page_pixel_size(self.page_size, self.dpi)
+        sx, sy = thumb.width / width, thumb.height / height
+        return thumb.resize(size, Image.BILINEAR, box=(box[0] * sx, box[1] * sy, box[2] * sx, box[3] * sy))
+
+    def show_tile(self, col, row, image, final):
+        old = self.items.get((col, row))
+        with PROFILER.stage("photo"):
+            photo = ImageTk.PhotoImage(image)
+        if old:
+            self.canvas.itemconfigure(old[0], image=photo)
+            item = old[0]
+        else:
+            item = self.canvas.create_image(col * TILE_SIZE, row * TILE_SIZE, image=photo, anchor="nw")
+        self.items[(col, row)] = (item, photo, final)
+
+    def poll(self):
+        for _ in range(64):
+            try:
+                key = self.tiles.results.get_nowait()
+            except queue.Empty:
+                break
+            if key[0] == "error":
+                self.title.config(text=key[1])
+            elif key[0] == "size":
+                if self.page is not None and key[1] == (self.page.source_path, self.page.page_index):
+                    self.page_size = key[2]
+                    self.fit()
+            elif self.page is not None and key[:3] == (self.page.source_path, self.page.page_index, self.dpi):
+                cell = key[3:]
+                current = self.items.get(cell)
+                if current and not current[2]:
+                    tile = self.tiles.get(key)
+                    if tile is not None: self.show_tile(*cell, tile, True)
+        self.after(WORKER_POLL_MS, self.poll)
 
 # --- Main Application ---
 
+WORKER_POLL_MS = 50 # How often the Tk thread drains worker events
+PROFILE_REFRESH_MS = 1000 # Status line refresh while stage timings are shown
+DRAG_TICK_MS = 30 # Ghost window, drop marker and autoscroll updates while dragging
+
 class PDFEditorApp:
-    def __init__(self, root):
+    def __init__(self, root, ingest_workers=INGEST_WORKERS, image_dpi=None, profile=False):
         self.root = root
+        self.ingest_workers = ingest_workers
+        self.image_dpi = image_dpi # Downsample images above this when saving; None keeps them
+        self.profile = profile # Show stage timings in the status line
+        self.thumb_cache = ThumbnailCache()
+        if not self.thumb_cache.enabled: self.thumb_cache = None
+        self.sources = SourceRegistry() # Each source PDF is parsed once and shared by ingest and save
         self.root.title("Modern PDF Editor")
-        self.root.geometry("1100x800")
+        self.root.geometry("1260x800") # Room for all grid columns and the preview
         self.root.config(bg="#f5f5f5")
         
         # State
-        self.pages_data = [] # List of PageData objects (Ordered)
-        self.page_widgets = [] # List of DraggableThumbnail widgets
-        self.selected_indices = set()
+        self.doc = PageList(self.sources) # Page list operations live in the GUI-free engine
+        self.pages_data = self.doc.pages # List of PageData objects (Ordered), mutated only through self.doc
+        self.selected_indices = RangeSet() # Positions in pages_data, stored as runs
+        self.select_anchor = None # Position shift-click ranges start from
+        self.ingest_job = None # Running IngestJob, if any
+        self.save_job = None # Running SaveJob, if any
+        self.analysis = None # Running PageAnalysis, if any
+        self.project_path = None # Project file last opened or saved
+        self.saved_edit = None # Last logged edit when the project was saved; anything else is unsaved
+        self.renderer = RenderScheduler(self.thumb_cache) # Lazy pages near the viewport
+        self.resident = ResidentThumbnails()
+        self.tiles = TileRenderer(self.sources) # Preview tiles at zoom DPI
         
         # Drag State
-        self.drag_data = {"item_idx": None, "window": None}
+        self.drag_data = {"pages": None, "window": None, "after": None}
+        self.pending_click = None # Selected page clicked without modifiers; applied on release unless dragged
 
         self.setup_ui()
+        self.root.after(WORKER_POLL_MS, self.poll_renderer)
+        if profile: self.refresh_profile()
     
     def setup_ui(self):
         # 1. Top Bar (File Ops & Output)
@@ -201,6 +694,12 @@ class PDFEditorApp:
         tk.Label(top_bar, text="Actions:", font=("Segoe UI", 10, "bold"), bg="white").pack(side=tk.LEFT)
         RoundedButton(top_bar, "Add PDF", self.add_pdf, width=100, height=30, bg="#4A90E2").pack(side=tk.LEFT, padx=10)
         RoundedButton(top_bar, "Insert After Selected", self.insert_pdf_at_selection, width=160, height=30, bg="#357ABD").pack(side=tk.LEFT, padx=0)
+        RoundedButton(top_bar, "Undo", self.undo, width=60, height=30, bg="#95a5a6").pack(side=tk.LEFT, padx=(10, 0))
+        RoundedButton(top_bar, "Redo", self.redo, width=60, height=30, bg="#95a5a6").pack(side=tk.LEFT, padx=5)
+        self.root.bind("<Control-z>", lambda e: self.undo())
+        self.root.bind("<Control-y>", lambda e: self.redo())
+        self.root.bind("<Control-Z>", lambda e: self.redo()) # Ctrl+Shift+Z
+        self.root.bind("<F12>", lambda e: self.export_profile())
 
         # Output Path
         tk.Frame(top_bar, width=20, bg="white").pack(side=tk.LEFT) # Spacer
@@ -227,22 +726,32 @@ class PDFEditorApp:
         self.info_label = tk.Label(toolbar, text="0 Pages loaded", bg="#f5f5f5", fg="#666", font=("Segoe UI", 11))
         self.info_label.pack(side=tk.LEFT)
         
+        self.ingest_progress = ProgressIndicator(toolbar)
+        self.save_progress = ProgressIndicator(toolbar)
+        
         # Right aligned action buttons
         RoundedButton(toolbar, "Clear All", self.clear_all, bg="#7f8c8d", width=90, height=30).pack(side=tk.RIGHT, padx=5)
         RoundedButton(toolbar, "Remove Selected", self.remove_selected, bg="#e53935", hover_bg="#c62828", width=140, height=30).pack(side=tk.RIGHT, padx=5)
-
-        # The Grid Area
-        self.canvas = tk.Canvas(work_frame, bg="#e0e0e0", highlightthickness=0)
-        scrollbar = tk.Scrollbar(work_frame, orient=tk.VERTICAL, command=self.canvas.yview)
-        
-        self.scrollable_frame = tk.Frame(self.canvas, bg="#e0e0e0")
-        self.scrollable_frame.bind("<Configure>", lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
-        
-        self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
-        self.canvas.configure(yscrollcommand=scrollbar.set)
+        RoundedButton(toolbar, "Find Blanks/Duplicates", self.find_blanks_and_duplicates, bg="#8e44ad", hover_bg="#7d3c98", width=170, height=30).pack(side=tk.RIGHT, padx=5)
         
-        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        # Spec selection: "1-500", "odd", "every 2nd page", "file scan*.pdf"
+        RoundedButton(toolbar, "Select", self.select_by_spec, bg="#95a5a6", width=70, height=30).pack(side=tk.RIGHT, padx=5)
+        self.select_var = tk.StringVar()
+        select_entry = tk.Entry(toolbar, textvariable=self.select_var, width=18, font=("Segoe UI", 10), bd=1, relief=tk.SOLID)
+        select_entry.pack(side=tk.RIGHT, ipady=4)
+        select_entry.bind("<Return>", lambda e: self.select_by_spec())
+
+        # The Grid Area (only visible rows get widgets), with the page preview beside it
+        panes = tk.PanedWindow(work_frame, orient=tk.HORIZONTAL, bg="#f5f5f5", sashwidth=6, bd=0)
+        panes.pack(fill=tk.BOTH, expand=True)
+        self.grid = ThumbnailGrid(panes, lambda: self.pages_data, lambda i: i in self.selected_indices,
+                                  self.on_thumb_click, self.on_drag_start, self.on_drag_end, self.on_viewport_changed)
+        self.preview = PreviewPane(panes, self.tiles)
+        # The grid has no horizontal scrollbar, so it never gets narrower than its columns
+        grid_w = GRID_COLUMNS * self.grid.cell_w + self.grid.scrollbar.winfo_reqwidth()
+        panes.add(self.grid, minsize=grid_w, width=grid_w, stretch="always")
+        panes.add(self.preview, minsize=200, width=360)
+        self.canvas = self.grid.canvas
         
         # Mousewheel binding
         self.canvas.bind_all("<MouseWheel>", lambda e: self.canvas.yview_scroll(int(-1*(e.delta/120)), "units"))
@@ -252,7 +761,12 @@ class PDFEditorApp:
         bottom_bar.pack(fill=tk.X, side=tk.BOTTOM)
         bottom_bar.pack_propagate(False)
         
-        RoundedButton(bottom_bar, "Save Final PDF", self.save_pdf, bg="#27ae60", hover_bg="#219150", width=200, height=45, radius=10, font=("Segoe UI", 12, "bold")).pack(pady=12)
+        RoundedButton(bottom_bar, "Open Project", self.open_project, bg="#95a5a6", width=120, height=35).pack(side=tk.LEFT, padx=(20, 5))
+        RoundedButton(bottom_bar, "Save Project", self.save_project, bg="#95a5a6", width=120, height=35).pack(side=tk.LEFT, padx=5)
+        RoundedButton(bottom_bar, "Split Export", self.split_export, bg="#357ABD", width=120, height=35).pack(side=tk.RIGHT, padx=20)
+        
+        self.save_button = RoundedButton(bottom_bar, "Save Final PDF", self.save_pdf, bg="#27ae60", hover_bg="#219150", width=200, height=45, radius=10, font=("Segoe UI", 12, "bold"))
+        self.save_button.pack(pady=12)
 
     # --- Logic ---
 
@@ -269,10 +783,14 @@ class PDFEditorApp:
             return
             
         # Find the highest index selected to insert after
-        insert_idx = max(self.selected_indices) + 1
+        insert_idx = self.selected_indices.last + 1
         self.add_pdf(insert_index=insert_idx)
 
     def process_files(self, filenames, insert_index=None):
+        if self.ingest_job:
+            self.banner.show_message("Still loading the previous files, please wait", "warning")
+            return
+
         # If this is the first file loaded, set default output path
         if not self.pages_data and len(filenames) > 0:
             first_file = filenames[0]
@@ -281,57 +799,170 @@ class PDFEditorApp:
             default_out = os.path.join(folder, f"{name}_merged.pdf")
             self.output_var.set(default_out)
 
-        total_new = 0
-        new_pages = []
+        # Parsing and rasterizing run on a worker; placeholders fill the grid as soon as page counts are known
+        self.ingest_job = IngestJob(filenames, insert_index, self.ingest_workers, self.thumb_cache, self.sources)
+        if insert_index: self.ingest_job.insert_after = self.pages_data[insert_index - 1]
+        self.ingest_progress.start("Reading files...", self.cancel_ingest)
+        self.ingest_job.start()
+        self.root.after(WORKER_POLL_MS, self.poll_ingest)
 
-        # Show loading indicator (cursor)
-        self.root.config(cursor="watch")
-        self.root.update()
+    def cancel_ingest(self):
+        if self.ingest_job:
+            self.ingest_job.cancel()
+            self.ingest_progress.set_cancelling()
 
-        try:
-            for fpath in filenames:
-                try:
-                    # Load PDF
-                    reader = PdfReader(fpath)
-                    count = len(reader.pages)
-                    
-                    # Generate thumbnails (Limit resolution for performance)
-                    # Note: Requires Poppler installed
-                    images = convert_from_path(fpath, dpi=40) 
-                    
-                    fname = os.path.basename(fpath)
-                    short_name = (fname[:10] + '..') if len(fname) > 10 else fname
-                    
-                    for i in range(count):
-                        # Create PageData object
-                        img = images[i] if i < len(images) else Image.new('RGB', (100, 130), 'white')
-                        p = PageData(fpath, i, img, f"{short_name}\nPg {i+1}")
-                        new_pages.append(p)
-                        
-                    total_new += count
-                except Exception as e:
-                    self.banner.show_message(f"Error reading {os.path.basename(fpath)}: {e}", "error")
+    def poll_ingest(self):
+        job = self.ingest_job
+        if job is None: return
+        
+        # Drain a bounded number of events per tick to keep the UI responsive
+        for _ in range(32):
+            try:
+                event = job.events.get_nowait()
+            except queue.Empty:
+                break
             
-            # Insert into main list
-            if insert_index is None:
-                self.pages_data.extend(new_pages)
-            else:
-                self.pages_data[insert_index:insert_index] = new_pages
-                
-            self.refresh_grid()
-            self.banner.show_message(f"Added {total_new} pages", "success")
+            kind = event[0]
+            if kind == "error":
+                _, fpath, e = event
+                self.banner.show_message(f"Error reading {os.path.basename(fpath)}: {e}", "error")
+            elif kind == "planned":
+                if not job.cancelled: self.insert_placeholders(job, event[1], event[2])
+            elif kind in ("rendered", "failed") and event[1] >= len(job.file_pages):
+                pass # Cancelled before its placeholders were inserted; nothing shows these pages
+            elif kind == "rendered":
+                self.fill_thumbnails(job, *event[1:])
+            elif kind == "failed":
+                _, file_no, e = event
+                fpath = job.file_pages[file_no][0].source_path
+                for p in job.file_pages[file_no]: p.pending = False
+                self.drop_pages(job.file_pages[file_no])
+                job.file_pages[file_no] = []
+                self.banner.show_message(f"Error reading {os.path.basename(fpath)}: {e}", "error")
+            elif kind == "finished":
+                self.finish_ingest(job)
+                return
+        
+        self.root.after(WORKER_POLL_MS, self.poll_ingest)
+
+    def insert_placeholders(self, job, counts, lazy):
+        new_pages = []
+        for (fpath, count), is_lazy in zip(counts, lazy):
+            pages = [PageData(fpath, i) for i in range(count)]
+            if not is_lazy:
+                for p in pages: p.pending = True
+                job.total_pages += count
+            job.file_pages.append(pages)
+            new_pages.extend(pages)
+        
+        # Insert into main list, after the page that preceded insert_index when the load started
+        index = job.insert_index
+        if job.insert_after is not None:
+            try: index = self.pages_data.index(job.insert_after) + 1
+            except ValueError: pass # That page was removed meanwhile; insert clamps the old index
+        self.doc.insert(index, new_pages)
             
-        finally:
-            self.root.config(cursor="")
+        self.refresh_grid()
+        self.ingest_progress.update_progress(0, job.total_pages, f"Rendering 0/{job.total_pages} pages")
+
+    def fill_thumbnails(self, job, file_no, start, count, images):
+        pages = job.file_pages[file_no]
+        for i in range(count):
+            page = pages[start + i]
+            page.pending = False
+            if i < len(images): # A short shard leaves the rest to the RenderScheduler, not a blank stand-in
+                page.image = images[i]
+                self.grid.update_image(page)
+        self.resident.touch(pages[start:start + count])
+        self.evict_thumbnails()
+        job.done_pages += count
+        self.ingest_progress.update_progress(job.done_pages, job.total_pages,
+                                             f"Rendering {job.done_pages}/{job.total_pages} pages")
+
+    def drop_pages(self, pages):
+        # Pages of a cancelled or failed load: gone for good, so not logged and not kept for undo
+        self.doc.discard(pages)
+        self.release_pages(pages)
+        for page in pages: page.image = None
+        self.release_sources()
+        self.clear_selection()
+        self.refresh_grid()
+
+    def finish_ingest(self, job):
+        self.ingest_job = None
+        self.ingest_progress.stop()
+        if job.cancelled:
+            # Cancelling undoes the whole batch rather than leaving half-rendered files behind
+            pages = [p for pages in job.file_pages for p in pages]
+            for p in pages: p.pending = False
+            self.drop_pages(pages)
+            self.banner.show_message("Loading cancelled", "info")
+        else:
+            total_new = sum(len(pages) for pages in job.file_pages)
+            self.banner.show_message(f"Added {total_new} pages", "success")
+
+    def on_viewport_changed(self, start, stop):
+        # Ask for missing thumbnails around the viewport, closest to its centre first
+        margin = RENDER_PREFETCH_ROWS * GRID_COLUMNS
+        lo, hi = max(0, start - margin), min(len(self.pages_data), stop + margin)
+        centre = (start + stop) // 2
+        failed = self.renderer.failed
+        wanted = [i for i in range(lo, hi) if not self.pages_data[i].has_image and not self.pages_data[i].pending
+                  and self.pages_data[i] not in failed]
+        wanted.sort(key=lambda i: abs(i - centre))
+        self.renderer.request([self.pages_data[i] for i in wanted])
+        self.resident.touch(self.pages_data[start:stop])
+
+    def poll_renderer(self):
+        delivered, failed = [], []
+        for _ in range(64):
+            try:
+                page, image, error = self.renderer.results.get_nowait()
+            except queue.Empty:
+                break
+            if error is not None:
+                failed.append(error) # The page keeps its placeholder and is not requested again
+            elif not page.has_image:
+                page.image = image
+                self.grid.update_image(page)
+                delivered.append(page)
+        if failed:
+            self.banner.show_message(f"{len(failed)} pages could not be rendered: {failed[0]}", "error")
+        if delivered:
+            self.resident.touch(delivered)
+            self.evict_thumbnails()
+        self.root.after(WORKER_POLL_MS, self.poll_renderer)
+
+    def evict_thumbnails(self):
+        # Keep what is on screen; everything else beyond the budget is dropped and re-rendered on demand
+        start, stop = self.grid.visible_range()
+        self.resident.touch(self.pages_data[start:stop])
+        self.grid.forget_pages(self.resident.evict())
+
+    def release_pages(self, pages):
+        # Pages leaving the document give back their PhotoImage. Their thumbnails stay until the
+        # resident budget evicts them, so an undo shortly after brings them back without rendering.
+        self.grid.forget_pages(pages)
+
+    def release_sources(self):
+        # Close parsed sources that no page (or running save) refers to any more
+        paths = {p.source_path for p in self.pages_data}
+        if self.save_job: paths |= self.save_job.source_paths
+        if self.preview.page is not None and self.preview.page.source_path not in paths: self.preview.clear()
+        self.sources.retain(paths)
 
     def browse_output(self):
         f = filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF files", "*.pdf")])
         if f: self.output_var.set(f)
 
     def clear_all(self):
-        self.pages_data.clear()
-        self.selected_indices.clear()
+        self.cancel_ingest()
+        self.release_pages(self.doc.clear())
+        self.release_sources()
+        self.clear_selection()
         self.output_var.set("")
+        self.project_path = None
+        self.replace_pack(None)
         self.refresh_grid()
         self.banner.show_message("All pages cleared", "info")
 
@@ -340,129 +971,303 @@ class PDFEditorApp:
             self.banner.show_message("No pages selected to remove", "warning")
             return
             
-        # Sort indices in descending order to delete correctly
-        for idx in sorted(self.selected_indices, reverse=True):
-            del self.pages_data[idx]
-            
-        self.selected_indices.clear()
+        # One pass over the list, however many pages are selected
+        removed = self.doc.delete(self.selected_indices.ranges())
+        self.release_pages(removed)
+        self.release_sources()
+        self.clear_selection()
         self.refresh_grid()
-        self.banner.show_message("Selected pages removed", "info")
+        self.banner.show_message(f"{len(removed)} selected pages removed", "info")
+
+    def undo(self):
+        if not self.doc.undo_stack:
+            self.banner.show_message("Nothing to undo", "warning")
+            return
+        self.show_history_step(self.doc.undo(), "Undid")
+
+    def redo(self):
+        if not self.doc.redo_stack:
+            self.banner.show_message("Nothing to redo", "warning")
+            return
+        self.show_history_step(self.doc.redo(), "Redid")
+
+    def show_history_step(self, edit, verb):
+        # Restored pages are the same PageData objects, so the grid reconciles them like any other edit
+        self.release_pages([p for _, pages in edit.removed for p in pages])
+        self.release_sources()
+        self.clear_selection()
+        for at, pages in edit.inserted: self.selected_indices.add_range(at, at + len(pages))
+        self.refresh_grid()
+        
+        # Bring the change into view unless it already is
+        start, stop = self.grid.visible_range()
+        changed = [at for at, _ in edit.inserted] or [at for at, _ in edit.removed]
+        if changed and not start <= changed[0] < stop: self.grid.scroll_to_index(changed[0])
+        self.banner.show_message(f"{verb} {edit.label}", "info")
 
     def refresh_grid(self):
-        # Clean UI
-        for w in self.page_widgets: w.destroy()
-        self.page_widgets.clear()
-        
-        # Re-render
-        cols = 6
-        for i, p_data in enumerate(self.pages_data):
-            row, col = divmod(i, cols)
-            
-            thumb = DraggableThumbnail(self.scrollable_frame, p_data, 
-                                     self.on_thumb_click,
-                                     self.on_drag_start,
-                                     self.on_drag_end)
-            thumb.grid(row=row, column=col, padx=10, pady=10)
-            
-            # Restore selection state
-            if i in self.selected_indices:
-                thumb.set_selected(True)
-                
-            self.page_widgets.append(thumb)
-            
-        self.info_label.config(text=f"{len(self.pages_data)} Pages | Drag to reorder")
+        with PROFILER.stage("grid refresh"):
+            self.grid.refresh()
+        self.update_info()
 
-    # --- Interaction Logic ---
+    def update_info(self):
+        selected = f" | {len(self.selected_indices)} selected" if self.selected_indices else ""
+        status = f" | {PROFILER.summary()}" if self.profile else " | Drag to reorder"
+        self.info_label.config(text=f"{len(self.pages_data)} Pages{selected}{status}")
 
-    def on_thumb_click(self, widget, is_ctrl_pressed):
-        # Find index of widget
+    def refresh_profile(self):
+        self.update_info()
+        self.root.after(PROFILE_REFRESH_MS, self.refresh_profile)
+
+    def export_profile(self, path=None):
+        path = path or filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON files", "*.json")],
+                                                    initialfile="pdf_editor_profile.json")
+        if not path: return
         try:
-            idx = self.page_widgets.index(widget)
-        except ValueError: return
-
-        if is_ctrl_pressed:
-            # Toggle
-            if idx in self.selected_indices:
-                self.selected_indices.remove(idx)
-                widget.set_selected(False)
-            else:
-                self.selected_indices.add(idx)
-                widget.set_selected(True)
+            PROFILER.export(path)
+        except OSError as e:
+            self.banner.show_message(f"Could not export profile: {e}", "error")
+            return
+        self.banner.show_message(f"Profile written to {os.path.basename(path)}", "success")
+
+    def find_blanks_and_duplicates(self):
+        if not PageAnalysis.available:
+            self.banner.show_message("Finding blank and duplicate pages requires NumPy", "error")
+            return
+        if not self.pages_data:
+            self.banner.show_message("No pages loaded", "warning")
+            return
+        if self.analysis: return
+        
+        # Works from the thumbnails already rendered (or cached); the grid stays usable meanwhile
+        self.analysis = PageAnalysis(self.pages_data, self.thumb_cache)
+        self.analysis.start()
+        self.banner.show_message("Looking for blank and duplicate pages...", "info")
+        self.root.after(WORKER_POLL_MS, self.poll_analysis)
+
+    def poll_analysis(self):
+        job = self.analysis
+        if not job.done.is_set():
+            self.root.after(WORKER_POLL_MS, self.poll_analysis)
+            return
+        self.analysis = None
+        if job.error:
+            self.banner.show_message(f"Page analysis failed: {job.error}", "error")
+            return
+        
+        # Preselect the matches still in the document so they can be reviewed and removed
+        position = {page: i for i, page in enumerate(self.pages_data)}
+        blank = [position[p] for p in job.blank if p in position]
+        duplicates = [position[p] for p, _ in job.duplicates if p in position]
+        self.clear_selection()
+        self.selected_indices.update(ranges_from_indices(blank + duplicates))
+        self.show_selection()
+        if self.selected_indices: self.grid.scroll_to_index(self.selected_indices.first)
+        
+        message = f"Selected {len(blank)} blank and {len(duplicates)} duplicate pages for review"
+        if job.skipped: message += f" ({job.skipped} pages not rendered yet were skipped)"
+        self.banner.show_message(message, "info" if self.selected_indices else "success")
+
+    # --- Interaction Logic ---
+
+    def on_thumb_click(self, widget, is_ctrl_pressed, is_shift_pressed=False):
+        idx = widget.index
+        if idx is None: return
+
+        if is_shift_pressed and self.select_anchor is not None:
+            # Range from the last clicked page; Ctrl+Shift adds it to the selection
+            if not is_ctrl_pressed: self.selected_indices.clear()
+            lo, hi = sorted((self.select_anchor, idx))
+            self.selected_indices.add_range(lo, hi + 1)
+        elif is_ctrl_pressed:
+            self.selected_indices.toggle(idx)
+            self.select_anchor = idx
         else:
+            if idx in self.selected_indices and len(self.selected_indices) > 1:
+                # Might be the start of a block drag; on_drag_end selects just this page otherwise
+                self.pending_click = idx
+                return
             # Exclusive select
-            for old_idx in self.selected_indices:
-                if old_idx < len(self.page_widgets):
-                    self.page_widgets[old_idx].set_selected(False)
+            self.pending_click = None
             self.selected_indices.clear()
-            
             self.selected_indices.add(idx)
-            widget.set_selected(True)
+            self.select_anchor = idx
+        self.preview.show_page(widget.page_data)
+        self.show_selection()
+
+    def show_selection(self):
+        # Only bound widgets show selection; the rest pick it up when scrolled into view
+        for widget in self.grid.visible_widgets():
+            selected = widget.index in self.selected_indices
+            if widget.is_selected != selected: widget.set_selected(selected)
+        self.update_info()
+
+    def clear_selection(self):
+        self.selected_indices.clear()
+        self.select_anchor = None
+
+    def select_by_spec(self):
+        spec = self.select_var.get().strip()
+        if not spec: return
+        try:
+            ranges = self.doc.select(spec)
+        except ValueError as e:
+            self.banner.show_message(str(e), "error")
+            return
+        self.clear_selection()
+        self.selected_indices.update(ranges)
+        if ranges: self.select_anchor = ranges[0][0]
+        self.show_selection()
+        self.banner.show_message(f"{len(self.selected_indices)} pages selected", "info")
 
     def on_drag_start(self, widget, event):
+        idx = widget.index
+        if idx is None: return
+        self.pending_click = None
+        
+        # Dragging a selected page drags the whole selection as one block
+        if idx not in self.selected_indices:
+            self.clear_selection()
+            self.selected_indices.add(idx)
+            self.select_anchor = idx
+            self.show_selection()
+        # Kept as pages, not positions: loading, undo or redo can change the list during the drag
+        self.drag_data["pages"] = set(self.pages_data[i] for i in self.selected_indices)
+        count = len(self.drag_data["pages"])
+        
+        # Create semi-transparent ghost window
+        top = tk.Toplevel(self.root)
+        top.overrideredirect(True)
+        top.attributes('-alpha', 0.6)
+        
+        # Copy image to label
+        text = widget.page_data.display_index_str if count == 1 else f"{count} pages"
+        lbl = tk.Label(top, image=widget.photo, text=text, compound=tk.TOP,
+                       bg="white", relief=tk.SOLID, bd=2)
+        lbl.pack()
+        
+        self.drag_data["window"] = top
+        # Released outside the original widget (e.g. after it scrolled away): end the drag anyway
+        self.root.bind("<ButtonRelease-1>", lambda e: self.on_drag_end(e))
+        self.drag_tick()
+
+    def drag_tick(self):
+        # Runs while dragging, so the view keeps scrolling with the pointer held still at an edge
+        if not self.drag_data["window"]: return
+        x, y = self.root.winfo_pointerx(), self.root.winfo_pointery()
+        self.drag_data["window"].geometry(f"+{x+10}+{y+10}")
+        self.grid.autoscroll(y)
+        self.grid.show_drop_marker(self.grid.drop_gap(x, y))
+        self.drag_data["after"] = self.root.after(DRAG_TICK_MS, self.drag_tick)
+
+    def on_drag_end(self, event, dragged=True):
+        if not dragged:
+            # A plain click on an already selected page selects just that page on release
+            if self.pending_click is not None and self.pending_click < len(self.pages_data):
+                self.clear_selection()
+                self.selected_indices.add(self.pending_click)
+                self.select_anchor = self.pending_click
+                self.pending_click = None
+                self.show_selection()
+            return
+        if not self.drag_data["window"]: return
+        
+        self.drag_data["window"].destroy()
+        self.drag_data["window"] = None
+        self.root.after_cancel(self.drag_data["after"])
+        self.root.unbind("<ButtonRelease-1>")
+        self.grid.hide_drop_marker()
+        dragged, self.drag_data["pages"] = self.drag_data["pages"], None
+        ranges = ranges_from_indices(i for i, p in enumerate(self.pages_data) if p in dragged)
+        if not ranges: return # All of them went away during the drag
+
+        # The drop gap follows from the pointer position and the fixed cell size
+        gap = self.grid.drop_gap(self.root.winfo_pointerx(), self.root.winfo_pointery())
+        if len(ranges) == 1 and ranges[0][0] <= gap <= ranges[0][1]: return # Dropped onto itself
+
+        count = sum(stop - start for start, stop in ranges)
+        first = self.doc.move_block(ranges, gap)
+        
+        # The moved block stays selected at its new position
+        self.clear_selection()
+        self.selected_indices.add_range(first, first + count)
+        self.select_anchor = first
+        
+        self.refresh_grid()
+        self.banner.show_message("Page reordered" if count == 1 else f"{count} pages reordered", "info")
+
+    # --- Project Files ---
+
+    @property
+    def has_unsaved_edits(self):
+        last = self.doc.undo_stack[-1] if self.doc.undo_stack else None
+        return bool(self.pages_data) and last is not self.saved_edit
+
+    def open_project(self, path=None):
+        if self.ingest_job or self.save_job:
+            self.banner.show_message("Wait for loading or saving to finish first", "warning")
+            return
+        path = path or filedialog.askopenfilename(filetypes=[("PDF Editor projects", f"*{PROJECT_SUFFIX}")])
+        if not path: return
         try:
-            idx = self.page_widgets.index(widget)
-            self.drag_data["item_idx"] = idx
-            
-            # Create semi-transparent ghost window
-            top = tk.Toplevel(self.root)
-            top.overrideredirect(True)
-            top.attributes('-alpha', 0.6)
-            
-            # Copy image to label
-            lbl = tk.Label(top, image=widget.photo, bg="white", relief=tk.SOLID, bd=2)
-            lbl.pack()
-            
-            self.drag_data["window"] = top
-            self.update_drag_window(event)
-            
-        except ValueError: pass
-
-    def on_drag_motion_global(self, event):
-        # This would be needed if dragging outside the widget, 
-        # but Toplevel follows mouse via bind on widget
-        pass
-
-    def update_drag_window(self, event):
-        if self.drag_data["window"]:
-            x, y = self.root.winfo_pointerx(), self.root.winfo_pointery()
-            self.drag_data["window"].geometry(f"+{x+10}+{y+10}")
-
-    def on_drag_end(self, event):
-        if self.drag_data["window"]:
-            self.drag_data["window"].destroy()
-            self.drag_data["window"] = None
-        
-        start_idx = self.drag_data["item_idx"]
-        if start_idx is None: return
-
-        # Calculate where we dropped it
-        # We need relative coordinates to the scrollable frame
-        x_root, y_root = self.root.winfo_pointerx(), self.root.winfo_pointery()
-        
-        # Find the nearest widget
-        nearest_idx = start_idx
-        min_dist = float('inf')
-        
-        for i, widget in enumerate(self.page_widgets):
-            wx = widget.winfo_rootx() + widget.winfo_width() // 2
-            wy = widget.winfo_rooty() + widget.winfo_height() // 2
-            dist = math.hypot(wx - x_root, wy - y_root)
-            
-            if dist < min_dist:
-                min_dist = dist
-                nearest_idx = i
-
-        if nearest_idx != start_idx:
-            # Move item in data list
-            item = self.pages_data.pop(start_idx)
-            self.pages_data.insert(nearest_idx, item)
-            
-            # Clear selection to avoid confusion or remap it
-            self.selected_indices.clear()
-            self.selected_indices.add(nearest_idx)
-            
-            self.refresh_grid()
-            self.banner.show_message("Page reordered", "info")
+            project = load_project(path, self.sources)
+        except ProjectError as e:
+            self.banner.show_message(str(e), "error")
+            return
+        
+        # Pages come back without images; the grid pulls their thumbnails from the pack as they scroll into view
+        self.release_pages(self.doc.load(project.pages))
+        self.replace_pack(project.pack)
+        self.clear_selection()
+        self.output_var.set(project.output_path)
+        self.project_path = path
+        self.saved_edit = None
+        self.release_sources()
+        self.canvas.yview_moveto(0)
+        self.refresh_grid()
+        
+        message = f"Opened {os.path.basename(path)}: {len(project.pages)} pages"
+        if project.missing: message += f", {len(project.missing)} missing source(s) left out"
+        if project.stale: message += f", {len(project.stale)} changed source(s) re-rendered"
+        self.banner.show_message(message, "warning" if project.missing or project.stale else "success")
+
+    def save_project(self):
+        if not self.pages_data:
+            self.banner.show_message("No pages to save!", "error")
+            return False
+        path = self.project_path or filedialog.asksaveasfilename(
+            defaultextension=PROJECT_SUFFIX, filetypes=[("PDF Editor projects", f"*{PROJECT_SUFFIX}")])
+        if not path: return False
+        
+        # Thumbnails not resident are copied over from the open project's pack where it has them
+        pack, keys = self.renderer.pack, {}
+        def thumbnail(page):
+            if not pack: return None
+            if page.source_path not in keys:
+                try: keys[page.source_path] = self.renderer.fingerprints.get(page.source_path)
+                except OSError: keys[page.source_path] = None
+            key = keys[page.source_path]
+            return pack.get(key, page.page_index) if key else None
+        try:
+            # The old pack is closed while the new one replaces its file, then the new one serves
+            self.replace_pack(save_project(path, self.pages_data, self.output_var.get(), thumbnail, pack))
+        except (OSError, ProjectError) as e:
+            self.banner.show_message(f"Saving project failed: {e}", "error")
+            return False
+        self.project_path = path
+        self.saved_edit = self.doc.undo_stack[-1] if self.doc.undo_stack else None
+        self.banner.show_message(f"Project saved to {os.path.basename(path)}", "success")
+        return True
+
+    def replace_pack(self, pack):
+        old, self.renderer.pack = self.renderer.pack, pack
+        if old: old.close()
+
+    def on_close(self):
+        if self.has_unsaved_edits:
+            answer = messagebox.askyesnocancel("Save project?", "Save the current pages as a project before closing?")
+            if answer is None or (answer and not self.save_project()): return
+        self.root.destroy()
 
     # --- Save ---
 
@@ -477,47 +1282,117 @@ class PDFEditorApp:
             self.browse_output()
             return
 
-        self.root.config(cursor="wait")
-        self.root.update()
+        if self.save_job:
+            self.banner.show_message("A save is already running", "warning")
+            return
+
+        # Assembly and writing run on a worker; the grid stays usable meanwhile
+        self.start_save(SaveJob(self.pages_data, output_path, self.sources, self.image_dpi))
+
+    def split_export(self):
+        if not self.pages_data:
+            self.banner.show_message("No pages to export!", "error")
+            return
+        if self.save_job:
+            self.banner.show_message("A save is already running", "warning")
+            return
+        
+        dialog = SplitDialog(self.root, bool(self.selected_indices))
+        self.root.wait_window(dialog)
+        if dialog.result is None: return
+        mode, every, name = dialog.result
+        folder = filedialog.askdirectory(title="Export split PDFs to")
+        if not folder: return
         
+        pages = [(p.source_path, p.page_index) for p in self.pages_data]
+        if mode == "every": groups = groups_every(len(pages), every)
+        elif mode == "files": groups = groups_by_source(pages)
+        else: groups = [[run] for run in self.selected_indices.ranges()]
         try:
-            writer = PdfWriter()
-            
-            # Cache open file handles to avoid opening/closing repeatedly
-            open_files = {} 
-            
-            for page_data in self.pages_data:
-                src = page_data.source_path
-                if src not in open_files:
-                    open_files[src] = open(src, 'rb')
-                    
-                # We need a fresh reader for the open file handle or PyPDF2 gets confused
-                # efficient way: Read objects on demand
-                # Simpler robust way for GUI: Re-read page
-                r = PdfReader(open_files[src])
-                writer.add_page(r.pages[page_data.page_index])
-            
-            with open(output_path, "wb") as f_out:
-                writer.write(f_out)
-                
-            # Close handles
-            for f in open_files.values():
-                f.close()
-                
-            self.banner.show_message(f"Successfully saved to {os.path.basename(output_path)}", "success")
+            outputs = split_outputs(pages, groups, folder, name)
+        except ValueError as e:
+            self.banner.show_message(str(e), "error")
+            return
+        existing = sum(os.path.exists(path) for path, _ in outputs)
+        if existing and not messagebox.askyesno("Split Export", f"{existing} of the {len(outputs)} files already exist. Overwrite them?"):
+            return
+        self.start_save(SplitJob(outputs, self.sources, self.ingest_workers, self.image_dpi))
+
+    def start_save(self, job):
+        self.save_job = job
+        self.save_button.set_enabled(False)
+        self.save_progress.start("Saving...", self.cancel_save)
+        job.start()
+        self.root.after(WORKER_POLL_MS, self.poll_save)
+
+    def cancel_save(self):
+        if self.save_job:
+            self.save_job.cancel()
+            self.save_progress.set_cancelling()
+
+    def poll_save(self):
+        job = self.save_job
+        while True:
+            try:
+                event = job.events.get_nowait()
+            except queue.Empty:
+                break
             
-        except Exception as e:
-            self.banner.show_message(f"Save failed: {e}", "error")
-            print(e)
-        finally:
-            self.root.config(cursor="")
+            kind = event[0]
+            if kind == "progress":
+                _, done, total = event
+                if not job.cancelled:
+                    unit = "files" if isinstance(job, SplitJob) else "pages"
+                    self.save_progress.update_progress(done, total, f"Saving {done}/{total} {unit}")
+            elif kind == "optimizing":
+                if not job.cancelled: self.save_progress.label.config(text="Optimizing...")
+            elif kind == "writing":
+                if not job.cancelled: self.save_progress.label.config(text="Writing file...")
+            elif kind == "finished":
+                self.finish_save(job, event[1])
+                return
+        
+        self.root.after(WORKER_POLL_MS, self.poll_save)
+
+    def finish_save(self, job, error):
+        self.save_job = None
+        self.save_progress.stop()
+        self.save_button.set_enabled(True)
+        self.release_sources()
+        
+        # The summary lists every stage with its time and bytes saved
+        if error is None and isinstance(job, SplitJob):
+            report = SaveReport.combined(r for _, r in job.reports)
+            self.banner.show_message(f"Exported {len(job.reports)} PDFs: {report.summary()}", "success")
+        elif error is None:
+            self.banner.show_message(f"Saved {os.path.basename(job.output_path)}: {job.report.summary()}", "success")
+        elif isinstance(error, SaveCancelled):
+            self.banner.show_message("Save cancelled", "info")
+        else:
+            self.banner.show_message(f"Save failed: {error}", "error")
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Modern PDF Editor")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS,
+                        help=f"processes used to rasterize thumbnails (default: {INGEST_WORKERS})")
+    parser.add_argument("--image-dpi", type=int, metavar="DPI",
+                        help="downsample images shown above DPI when saving (default: keep images as they are)")
+    parser.add_argument("--profile", action="store_true",
+                        help="show time spent per stage in the status line (F12 exports it as JSON at any time)")
+    parser.add_argument("--profile-out", metavar="JSON", help="write the stage profile to JSON on exit")
+    parser.add_argument("project", nargs="?", help=f"project file ({PROJECT_SUFFIX}) to open")
+    args = parser.parse_args()
+
     try:
         from ctypes import windll
         windll.shcore.SetProcessDpiAwareness(1) # Sharp text on Windows
     except: pass
     
     root = tk.Tk()
-    app = PDFEditorApp(root)
+    app = PDFEditorApp(root, ingest_workers=args.workers, image_dpi=args.image_dpi, profile=args.profile)
+    root.protocol("WM_DELETE_WINDOW", app.on_close)
+    if args.project: root.after_idle(app.open_project, args.project)
     root.mainloop()
+    app.sources.close_all()
+    if args.profile_out: PROFILER.export(args.profile_out)
@@ -0,0 +1,2238 @@
+"""GUI-free core of the PDF editor: the page model, source documents, thumbnail rendering and saving.
+
+PDFEditorApp drives this module for its grid. It can also run headless: page-spec scripts are
+executed without rendering any thumbnails, several at once on a process pool.
+
+    python pdf_engine.py [--workers N] [--no-optimize] [--image-dpi DPI] SCRIPT [SCRIPT ...]
+
+Script commands, one per line (# starts a comment, paths are relative to the script):
+    add FILE [PAGES]          append pages of FILE; PAGES like 1-3,7,10- (default: all)
+    insert POS FILE [PAGES]   insert pages of FILE so the first lands at position POS
+    delete SPEC               delete positions of the current list: 2,5-9 / odd / every 3rd page / file NAME
+    move FROM TO              move the page at position FROM to position TO
+    clear                     remove all pages
+    save OUTPUT               write the current list to OUTPUT
+    split every N DIR [NAME]  write every N pages to their own PDF in DIR
+    split files DIR [NAME]    write each run of pages from one source file to its own PDF in DIR
+    split SPEC DIR [NAME]     write each ";"-separated clause of SPEC to its own PDF in DIR
+                              NAME like "{n:03d}_{source}.pdf" (default); also {first}, {last}
+Positions and page numbers are 1-based.
+"""
+import os
+import sys
+import json
+import math
+import mmap
+import queue
+import shlex
+import struct
+import zlib
+import hashlib
+import tempfile
+import threading
+import subprocess
+import re
+import time
+import fnmatch
+from io import BytesIO
+from bisect import bisect_left, bisect_right
+from collections import deque, OrderedDict
+from functools import partial
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import (ArrayObject, DictionaryObject, EncodedStreamObject, IndirectObject, NameObject,
+                            NullObject, NumberObject, StreamObject)
+from pdf2image import convert_from_path
+from PIL import Image
+
+try:
+    import numpy as np
+except ImportError:
+    np = None # Blank and duplicate detection is unavailable without NumPy
+
+# --- Profiling ---
+
+PROFILE_VERSION = 1
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = None # No sysconf (Windows): resident memory is not reported
+
+def rss_bytes():
+    """Resident set size of this process, or None where /proc is not available."""
+    if _PAGE_SIZE is None: return None
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+def peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024 # Bytes on macOS, KiB elsewhere
+
+class Profiler:
+    """Wall time and memory per named stage, summed over the session. Thread-safe.
+
+    Code under test runs in `with PROFILER.stage(name):`. Each stage keeps its call count, total
+    and longest time, and how much the process's resident set grew across its calls (approximate
+    when stages overlap on several threads). Work in process pool workers is timed there and
+    merged with `add`; its memory is not counted. A forked child starts with a fresh lock and no
+    stages, since the fork may have happened while another thread held the lock.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+        if hasattr(os, "register_at_fork"): os.register_at_fork(after_in_child=self.after_fork)
+
+    def after_fork(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+
+    def reset(self):
+        with self.lock:
+            self.stages = {} # name -> [calls, seconds, max_seconds, rss_growth]
+            self.started = time.time()
+
+    @contextmanager
+    def stage(self, name):
+        rss = rss_bytes()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            after = rss_bytes() if rss is not None else None
+            self.add(name, time.perf_counter() - start, after - rss if after is not None else 0)
+
+    def add(self, name, seconds, rss_growth=0):
+        with self.lock:
+            stats = self.stages.get(name)
+            if stats is None: stats = self.stages[name] = [0, 0.0, 0.0, 0]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+            stats[3] += max(0, rss_growth)
+
+    def snapshot(self):
+        """The profile as a JSON-ready dict, stages by total time, longest first."""
+        with self.lock:
+            stages = sorted(self.stages.items(), key=lambda item: -item[1][1])
+            return {
+                "version": PROFILE_VERSION,
+                "started": self.started,
+                "elapsed": time.time() - self.started,
+                "rss_bytes": rss_bytes(),
+                "peak_rss_bytes": peak_rss_bytes(),
+                "stages": {name: {"calls": calls, "seconds": secs, "max_seconds": longest, "rss_growth_bytes": growth}
+                           for name, (calls, secs, longest, growth) in stages},
+            }
+
+    def summary(self, limit=4):
+        """One line for a status bar: the `limit` slowest stages and the resident memory."""
+        snap = self.snapshot()
+        parts = [f"{name} {s['seconds']:.1f}s" for name, s in list(snap["stages"].items())[:limit]]
+        if snap["rss_bytes"] is not None: parts.append(f"RSS {format_bytes(snap['rss_bytes'])}")
+        return " · ".join(parts)
+
+    def export(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+PROFILER = Profiler() # Shared by the engine, the editor and the benchmarks
+
+# --- Core Data Class ---
+
+THUMB_SIZE = (100, 130) # Display size of a thumbnail; the only size kept in memory or on disk
+
+class ThumbnailStore:
+    """Display-size RGB thumbnails packed into shared memory slabs, addressed by slot number.
+
+    Slabs hold `slab_slots` thumbnails each and are never resized, so the zero-copy images handed
+    out by `get` stay valid while their slot is held. Released slots are reused.
+    """
+    SLOT_BYTES = THUMB_SIZE[0] * THUMB_SIZE[1] * 3
+
+    def __init__(self, slab_slots=256):
+        self.slab_slots = slab_slots
+        self.slabs = []
+        self.free = []
+        self.used = 0
+        self.lock = threading.Lock()
+
+    def put(self, image, slot=-1):
+        """Stores `image` (downscaled to THUMB_SIZE if needed) and returns its slot."""
+        if image.size != THUMB_SIZE: image = image.resize(THUMB_SIZE)
+        if image.mode != "RGB": image = image.convert("RGB")
+        if slot < 0:
+            with self.lock:
+                if not self.free:
+                    base = len(self.slabs) * self.slab_slots
+                    self.slabs.append(bytearray(self.slab_slots * self.SLOT_BYTES))
+                    self.free.extend(range(base + self.slab_slots - 1, base - 1, -1))
+                slot = self.free.pop()
+                self.used += 1
+        self.view(slot)[:] = image.tobytes()
+        return slot
+
+    def get(self, slot):
+        return Image.frombuffer("RGB", THUMB_SIZE, self.view(slot), "raw", "RGB", 0, 1)
+
+    def view(self, slot):
+        slab, i = divmod(slot, self.slab_slots)
+        return memoryview(self.slabs[slab])[i * self.SLOT_BYTES:(i + 1) * self.SLOT_BYTES]
+
+    def release(self, slot):
+        with self.lock:
+            self.free.append(slot)
+            self.used -= 1
+
+THUMBNAILS = ThumbnailStore() # Shared by every PageData
+
+class PageData:
+    """Stores information about a specific page from a specific file.
+
+    Kept small because there is one per page: the source path is interned and shared, and the
+    thumbnail lives in THUMBNAILS rather than in a per-page image object.
+    """
+    __slots__ = ("source_path", "page_index", "slot", "pending")
+
+    def __init__(self, source_path, page_index, image=None):
+        self.source_path = sys.intern(source_path)
+        self.page_index = page_index # 0-based index in original file
+        self.slot = -1 # THUMBNAILS slot, -1 until rendered or after eviction
+        self.pending = False # True while an IngestJob owns rendering this page
+        if image is not None: self.image = image
+
+    @property
+    def has_image(self):
+        return self.slot >= 0
+
+    @property
+    def image(self):
+        """Display-size thumbnail, or None. source_path + page_index can always re-render it."""
+        return THUMBNAILS.get(self.slot) if self.slot >= 0 else None
+
+    @image.setter
+    def image(self, image):
+        if image is None:
+            if self.slot >= 0: THUMBNAILS.release(self.slot)
+            self.slot = -1
+        else:
+            self.slot = THUMBNAILS.put(image, self.slot)
+
+    @property
+    def display_index_str(self):
+        fname = os.path.basename(self.source_path)
+        short_name = (fname[:10] + '..') if len(fname) > 10 else fname
+        return f"{short_name}\nPg {self.page_index+1}"
+
+    @property
+    def id(self):
+        return f"{self.source_path}_{self.page_index}" # Unique ID
+
+# --- Page List ---
+
+def merge_ranges(ranges):
+    """Sorts 0-based half-open (start, stop) ranges and merges overlapping or touching ones."""
+    merged = []
+    for start, stop in sorted(r for r in ranges if r[0] < r[1]):
+        if merged and start <= merged[-1][1]:
+            if stop > merged[-1][1]: merged[-1] = (merged[-1][0], stop)
+        else:
+            merged.append((start, stop))
+    return merged
+
+def ranges_from_indices(indices):
+    """Collapses 0-based indices into merged half-open ranges."""
+    ranges = []
+    for i in sorted(indices):
+        if ranges and i == ranges[-1][1]:
+            ranges[-1] = (ranges[-1][0], i + 1)
+        elif not ranges or i > ranges[-1][1]:
+            ranges.append((i, i + 1))
+    return ranges
+
+class RangeSet:
+    """A set of non-negative ints kept as sorted, disjoint half-open (start, stop) runs.
+
+    Membership is a bisect, and adding or removing a run only touches the runs it overlaps, so
+    selecting pages 1-5000 costs as much as selecting one page.
+    """
+    def __init__(self, ranges=()):
+        self.starts, self.stops = [], []
+        self.count = 0
+        self.update(ranges)
+
+    def __contains__(self, i):
+        k = bisect_right(self.starts, i) - 1
+        return k >= 0 and i < self.stops[k]
+
+    def __len__(self):
+        return self.count
+
+    def __bool__(self):
+        return bool(self.starts)
+
+    def __iter__(self):
+        for start, stop in zip(self.starts, self.stops):
+            yield from range(start, stop)
+
+    def ranges(self):
+        return list(zip(self.starts, self.stops))
+
+    @property
+    def first(self):
+        return self.starts[0] if self.starts else None
+
+    @property
+    def last(self):
+        return self.stops[-1] - 1 if self.stops else None
+
+    def add_range(self, start, stop):
+        if start >= stop: return
+        lo = bisect_left(self.stops, start) # Runs ending at or after `start` touch the new one
+        hi = bisect_right(self.starts, stop)
+        if lo < hi:
+            self.count -= sum(b - a for a, b in zip(self.starts[lo:hi], self.stops[lo:hi]))
+            start, stop = min(start, self.starts[lo]), max(stop, self.stops[hi - 1])
+        self.starts[lo:hi] = [start]
+        self.stops[lo:hi] = [stop]
+        self.count += stop - start
+
+    def remove_range(self, start, stop):
+        lo = bisect_right(self.stops, start) # Runs that overlap [start, stop)
+        hi = bisect_left(self.starts, stop)
+        if lo >= hi or start >= stop: return
+        self.count -= sum(b - a for a, b in zip(self.starts[lo:hi], self.stops[lo:hi]))
+        keep = [(a, b) for a, b in ((self.starts[lo], start), (stop, self.stops[hi - 1])) if a < b]
+        self.starts[lo:hi] = [a for a, _ in keep]
+        self.stops[lo:hi] = [b for _, b in keep]
+        self.count += sum(b - a for a, b in keep)
+
+    def add(self, i):
+        self.add_range(i, i + 1)
+
+    def discard(self, i):
+        self.remove_range(i, i + 1)
+
+    def toggle(self, i):
+        if i in self: self.discard(i)
+        else: self.add(i)
+
+    def update(self, ranges):
+        for start, stop in ranges: self.add_range(start, stop)
+
+    def clear(self):
+        self.starts.clear()
+        self.stops.clear()
+        self.count = 0
+
+def parse_page_ranges(spec, count):
+    """Parses a 1-based page spec like "1-3,7,10-" into merged 0-based half-open ranges within `count`.
+
+    "all" or an empty spec selects every page. Raises ValueError for malformed specs.
+    """
+    spec = spec.strip().lower()
+    if spec in ("", "all"): return [(0, count)] if count else []
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        lo, sep, hi = part.partition("-")
+        try:
+            first = int(lo) if lo.strip() else 1
+            last = (int(hi) if hi.strip() else count) if sep else first
+        except ValueError:
+            raise ValueError(f"Bad page range '{part}'") from None
+        if first < 1 or last < first:
+            raise ValueError(f"Bad page range '{part}'")
+        ranges.append((first - 1, min(last, count)))
+    return merge_ranges(ranges)
+
+_EVERY_RE = re.compile(r"every (\d+)(?:st|nd|rd|th)?(?: pages?)?")
+_SOURCE_RE = re.compile(r"(?:all )?(?:pages of (?:file )?|file )(.+)", re.IGNORECASE)
+UNDO_LIMIT = 200 # Edits kept for undo
+
+class Edit:
+    """One reversible change to a PageList: the runs it took out, then the runs it put in.
+
+    Runs are (position, [PageData]); `removed` positions count before the edit, `inserted` positions
+    after it. Only the touched pages are referenced, so an edit costs memory in proportion to its size.
+    """
+    __slots__ = ("label", "removed", "inserted")
+
+    def __init__(self, label, removed=(), inserted=()):
+        self.label = label
+        self.removed = list(removed)
+        self.inserted = list(inserted)
+
+    def inverse(self):
+        return Edit(self.label, self.inserted, self.removed)
+
+class PageList:
+    """The ordered pages of the document being assembled, and the edits offered on them.
+
+    GUI-free: PDFEditorApp drives one for its grid and the CLI drives one per script. `pages` is
+    only ever mutated in place, so views holding on to the list stay valid. Every edit is logged as
+    an Edit for `undo`/`redo`; the last `undo_limit` are kept.
+    """
+    def __init__(self, sources=None, undo_limit=UNDO_LIMIT):
+        self.pages = [] # PageData, in output order
+        self.sources = sources or SourceRegistry()
+        self.undo_stack = deque(maxlen=undo_limit)
+        self.redo_stack = []
+
+    def __len__(self):
+        return len(self.pages)
+
+    def __iter__(self):
+        return iter(self.pages)
+
+    def __getitem__(self, index):
+        return self.pages[index]
+
+    def open_file(self, path, page_ranges=None):
+        """Returns new PageData for `path`: every page, or those in 0-based half-open `page_ranges`."""
+        count = self.sources.get(path).page_count
+        if page_ranges is None: page_ranges = [(0, count)]
+        return [PageData(path, i) for start, stop in page_ranges for i in range(start, min(stop, count))]
+
+    def insert(self, index, pages):
+        """Inserts pages before `index`, or appends them if index is None."""
+        pages = list(pages)
+        if index is None: index = len(self.pages)
+        index = min(index, len(self.pages))
+        self.pages[index:index] = pages
+        self.record(Edit(f"add {len(pages)} pages", inserted=[(index, pages)]))
+
+    def append(self, pages):
+        self.insert(None, pages)
+
+    def select(self, spec):
+        """Returns the 0-based half-open ranges of positions matching a selection spec.
+
+        Clauses separated by ";" are combined. Each clause is one of (case-insensitive):
+            1-3,7,10-            positions, as for parse_page_ranges ("all" for every page)
+            odd, even            every other position, starting at the first or the second
+            every 3rd page       positions 3, 6, 9, ...
+            file NAME            pages of sources whose file name matches NAME (wildcards allowed),
+                                 also written "pages of NAME" or "all pages of file NAME"
+        Raises ValueError for anything else.
+        """
+        count = len(self.pages)
+        ranges = []
+        for clause in spec.split(";"):
+            clause = " ".join(clause.split())
+            every = _EVERY_RE.fullmatch(clause.lower())
+            source = _SOURCE_RE.fullmatch(clause)
+            if clause.lower() in ("odd", "even"):
+                ranges.extend((i, i + 1) for i in range(clause.lower() == "even", count, 2))
+            elif every:
+                step = int(every.group(1))
+                if step < 1: raise ValueError(f"Bad step in '{clause}'")
+                ranges.extend((i, i + 1) for i in range(step - 1, count, step))
+            elif source:
+                ranges.extend(self.source_ranges(source.group(1)))
+            else:
+                ranges.extend(parse_page_ranges(clause, count))
+        return merge_ranges(ranges)
+
+    def source_ranges(self, pattern):
+        """Runs of positions whose source file name (or full path) matches the glob `pattern`, ignoring case."""
+        pattern = pattern.strip("\"'").lower()
+        matches = {}
+        ranges = []
+        for i, page in enumerate(self.pages):
+            hit = matches.get(page.source_path)
+            if hit is None:
+                path = page.source_path.lower()
+                hit = matches[page.source_path] = (fnmatch.fnmatchcase(os.path.basename(path), pattern)
+                                                   or fnmatch.fnmatchcase(path, pattern))
+            if not hit: continue
+            if ranges and ranges[-1][1] == i: ranges[-1] = (ranges[-1][0], i + 1)
+            else: ranges.append((i, i + 1))
+        return ranges
+
+    def delete(self, ranges):
+        """Removes the 0-based half-open index ranges in a single pass and returns the removed pages."""
+        runs = self.cut(ranges)
+        removed = [p for _, pages in runs for p in pages]
+        self.record(Edit(f"delete {len(removed)} pages", removed=runs))
+        return removed
+
+    def delete_indices(self, indices):
+        return self.delete(ranges_from_indices(indices))
+
+    def remove_pages(self, pages):
+        """Removes the given PageData objects (by identity) and returns those that were present."""
+        doomed = set(pages)
+        return self.delete(ranges_from_indices(i for i, p in enumerate(self.pages) if p in doomed))
+
+    def move(self, src, dst):
+        """Moves the page at index `src` so it ends up at index `dst`."""
+        page = self.pages.pop(src)
+        self.pages.insert(dst, page)
+        self.record(Edit("move 1 page", removed=[(src, [page])], inserted=[(dst, [page])]))
+
+    def move_block(self, ranges, gap):
+        """Moves the pages in `ranges`, keeping their order, to the gap before position `gap`.
+
+        `gap` counts positions before the move (0 to len). Single pass; returns the position of the
+        first moved page afterwards.
+        """
+        runs, kept, pos, target = [], [], 0, gap
+        for start, stop in merge_ranges(ranges):
+            kept.extend(self.pages[pos:start])
+            runs.append((start, self.pages[start:stop]))
+            target -= max(0, min(stop, gap) - start)
+            pos = stop
+        kept.extend(self.pages[pos:])
+        moved = [p for _, pages in runs for p in pages]
+        kept[target:target] = moved
+        self.pages[:] = kept
+        self.record(Edit(f"move {len(moved)} pages", removed=runs, inserted=[(target, moved)]))
+        return target
+
+    def clear(self):
+        removed = self.pages[:]
+        self.pages.clear()
+        self.record(Edit("clear all", removed=[(0, removed)]))
+        return removed
+
+    def load(self, pages):
+        """Replaces every page with `pages` and starts a new edit log. Returns the old pages."""
+        old = self.pages[:]
+        self.pages[:] = pages
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        return old
+
+    # Edit log
+
+    def cut(self, ranges):
+        """Removes merged index ranges in one pass, without logging. Returns the removed runs."""
+        kept, runs, pos = [], [], 0
+        for start, stop in merge_ranges(ranges):
+            kept.extend(self.pages[pos:start])
+            if self.pages[start:stop]: runs.append((start, self.pages[start:stop]))
+            pos = stop
+        if runs:
+            kept.extend(self.pages[pos:])
+            self.pages[:] = kept
+        return runs
+
+    def paste(self, runs):
+        """Inserts (position, pages) runs, positions counted in the result, in one pass, without logging."""
+        result, pos = [], 0
+        for at, pages in sorted(runs, key=lambda run: run[0]):
+            take = at - len(result)
+            result.extend(self.pages[pos:pos + take])
+            result.extend(pages)
+            pos += take
+        result.extend(self.pages[pos:])
+        self.pages[:] = result
+
+    def record(self, edit):
+        if not edit.removed and not edit.inserted: return
+        self.undo_stack.append(edit)
+        self.redo_stack.clear()
+
+    def apply(self, edit):
+        self.cut([(at, at + len(pages)) for at, pages in edit.removed])
+        if edit.inserted: self.paste(edit.inserted)
+
+    def undo(self):
+        """Reverts the last edit and returns what was applied to do so (an Edit), or None."""
+        if not self.undo_stack: return None
+        edit = self.undo_stack.pop()
+        self.apply(edit.inverse())
+        self.redo_stack.append(edit)
+        return edit.inverse()
+
+    def redo(self):
+        """Re-applies the last undone edit and returns it, or None."""
+        if not self.redo_stack: return None
+        edit = self.redo_stack.pop()
+        self.apply(edit)
+        self.undo_stack.append(edit)
+        return edit
+
+    def discard(self, pages):
+        """Removes `pages` as if they had never been added: nothing is logged, and the edit log is
+        rewritten without them, so neither undo nor redo brings them back.
+
+        For pages whose loading was cancelled or failed. Walking back through the undo stack and
+        forward through the redo stack, the positions of the discarded pages are carried across
+        each edit arithmetically, so rewriting it costs its own size plus the number of discarded
+        pages, never the length of the list; edits left with nothing to do are dropped.
+        """
+        doomed = set(pages)
+        if not doomed: return
+        
+        def strip(runs, marks):
+            # marks: sorted positions of the doomed pages in the state the runs' positions count in
+            runs = [(at - bisect_left(marks, at), [p for p in run if p not in doomed]) for at, run in runs]
+            return [(at, run) for at, run in runs if run]
+        
+        def carry(marks, leaving, arriving):
+            # The doomed pages' positions across a change that cuts `leaving`, then pastes `arriving`
+            leaving, arriving = sorted(leaving, key=lambda run: run[0]), sorted(arriving, key=lambda run: run[0])
+            starts, cut_before = [at for at, _ in leaving], [0]
+            for _, run in leaving: cut_before.append(cut_before[-1] + len(run))
+            carried = [at + i for at, run in arriving for i, p in enumerate(run) if p in doomed]
+            for m in marks:
+                k = bisect_right(starts, m)
+                if k and m < starts[k - 1] + len(leaving[k - 1][1]): continue # Leaves with the change
+                m -= cut_before[k]
+                for at, run in arriving:
+                    if at > m: break
+                    m += len(run)
+                carried.append(m)
+            return sorted(carried)
+        
+        current = [i for i, p in enumerate(self.pages) if p in doomed]
+        marks = current
+        for edit in reversed(self.undo_stack): # From the state after each edit back to the one before it
+            before = carry(marks, edit.inserted, edit.removed)
+            edit.removed, edit.inserted = strip(edit.removed, before), strip(edit.inserted, marks)
+            marks = before
+        marks = current
+        for edit in reversed(self.redo_stack): # Next redo first
+            after = carry(marks, edit.removed, edit.inserted)
+            edit.removed, edit.inserted = strip(edit.removed, marks), strip(edit.inserted, after)
+            marks = after
+        
+        kept = [edit for edit in self.undo_stack if edit.removed or edit.inserted]
+        self.undo_stack.clear()
+        self.undo_stack.extend(kept)
+        self.redo_stack[:] = [edit for edit in self.redo_stack if edit.removed or edit.inserted]
+        self.cut(ranges_from_indices(current))
+
+    def source_paths(self):
+        return {p.source_path for p in self.pages}
+
+    def save(self, output_path, progress=None, cancel_event=None, optimize=True, image_dpi=None):
+        return write_pdf([(p.source_path, p.page_index) for p in self.pages], output_path,
+                         self.sources, progress, cancel_event, optimize, image_dpi)
+
+# --- Source Documents ---
+
+class SourceDocument:
+    """A source PDF parsed once and shared by ingest, rendering and saving.
+
+    Holds a PdfReader over a read-only memory map of the file, plus the page count, page boxes
+    (width, height in points) and rotations. The reader seeks a shared stream, so page access
+    has to hold `lock`. The reader caches every object it resolves, stream bytes included, so
+    after a save `forget_objects` drops what it resolved; only the page tree stays parsed.
+    """
+    def __init__(self, path):
+        self.path = path
+        st = os.stat(path)
+        self.stamp = (st.st_size, st.st_mtime_ns)
+        self.lock = threading.RLock()
+        self.file = open(path, 'rb')
+        self.data = None
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            with PROFILER.stage("parse"):
+                self.reader = PdfReader(self.data)
+                pages = self.reader.pages
+                self.page_count = len(pages)
+                self.boxes = [(float(p.mediabox.width), float(p.mediabox.height)) for p in pages]
+                self.rotations = [p.rotation % 360 for p in pages]
+        except Exception:
+            self.close()
+            raise
+
+    def is_current(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return False
+        return (st.st_size, st.st_mtime_ns) == self.stamp
+
+    def page_size(self, page_index):
+        """(width, height) in points as displayed, i.e. with the page rotation applied."""
+        width, height = self.boxes[page_index]
+        return (height, width) if self.rotations[page_index] in (90, 270) else (width, height)
+
+    def add_page_to(self, writer, page_index):
+        # Cloning resolves the page's objects from our stream
+        with self.lock:
+            writer.add_page(self.reader.pages[page_index])
+
+    def forget_objects(self):
+        # The pages list keeps its page dicts; contents, fonts and images are resolved again on demand
+        with self.lock:
+            self.reader.resolved_objects.clear()
+
+    def close(self):
+        if self.data is not None: self.data.close()
+        self.file.close()
+
+class SourceRegistry:
+    """Open SourceDocuments keyed by path, so each source is parsed at most once.
+
+    A document is reopened only if its file changed on disk. Call `retain` when pages leave the
+    document to close sources nothing refers to any more. Parsing holds only a lock for that
+    path, so a large file being opened never blocks lookups or `retain` for the others.
+    """
+    def __init__(self):
+        self.docs = {} # path -> SourceDocument
+        self.opening = {} # path -> Lock held while that path is parsed
+        self.lock = threading.Lock() # Guards docs and opening; never held while parsing
+
+    def lookup(self, path):
+        # The current document for path, if open; a stale one is dropped. Hold self.lock.
+        doc = self.docs.get(path)
+        if doc is not None and not doc.is_current():
+            self.docs.pop(path).close()
+            doc = None
+        return doc
+
+    def get(self, path):
+        with self.lock:
+            doc = self.lookup(path)
+            if doc is not None: return doc
+            path_lock = self.opening.setdefault(path, threading.Lock())
+        with path_lock:
+            with self.lock: # Another thread may have parsed it while we waited
+                doc = self.lookup(path)
+                if doc is not None: return doc
+            doc = SourceDocument(path)
+            with self.lock:
+                self.docs[path] = doc
+            return doc
+
+    def retain(self, paths):
+        with self.lock:
+            for path in [p for p in self.docs if p not in paths]:
+                self.docs.pop(path).close()
+
+    def release(self, path):
+        """Closes the document for the file at `path`, however the path is spelled, if it is open.
+
+        Windows cannot replace a file that is open or mapped, so a save over one of its own
+        sources has to release it first; the next `get` parses the new file.
+        """
+        target = os.path.normcase(os.path.abspath(path))
+        with self.lock:
+            for p in [p for p in self.docs if os.path.normcase(os.path.abspath(p)) == target]:
+                self.docs.pop(p).close()
+
+    def close_all(self):
+        self.retain(())
+
+class SourcePool:
+    """Hands out the pages of source PDFs for one save. Use as a context manager.
+
+    Documents come from a shared `registry` if given, which keeps them open for the next save
+    but forgets the objects this save resolved. Otherwise the pool opens its own and closes them
+    on exit, even if writing failed.
+    """
+    def __init__(self, registry=None):
+        self.registry = registry or SourceRegistry()
+        self.owns_registry = registry is None
+        self.docs = {} # source_path -> SourceDocument, checked against the registry once per save
+
+    def get_document(self, source_path):
+        doc = self.docs.get(source_path)
+        if doc is None:
+            doc = self.docs[source_path] = self.registry.get(source_path)
+        return doc
+
+    def get_page(self, source_path, page_index):
+        doc = self.get_document(source_path)
+        with doc.lock:
+            return doc.reader.pages[page_index]
+
+    def add_page_to(self, writer, source_path, page_index):
+        self.get_document(source_path).add_page_to(writer, page_index)
+
+    def close(self):
+        if self.owns_registry: self.registry.close_all()
+        else:
+            for doc in self.docs.values(): doc.forget_objects() # A shared document would pin them for the session
+        self.docs.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+# --- Thumbnail Cache ---
+
+THUMB_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+def user_cache_dir(app_name="pdf_editor"):
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, app_name)
+
+def file_fingerprint(path, sample=64 * 1024):
+    """Cheap content key for a file: size, mtime and a hash of its first and last `sample` bytes."""
+    st = os.stat(path)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{st.st_size}:{st.st_mtime_ns}".encode())
+    with open(path, 'rb') as f:
+        h.update(f.read(sample))
+        if st.st_size > sample:
+            f.seek(max(sample, st.st_size - sample))
+            h.update(f.read(sample))
+    return h.hexdigest()
+
+class Fingerprints:
+    """file_fingerprint per path, remembered until the file's size or mtime changes. Thread-safe."""
+    def __init__(self):
+        self.keys = {} # path -> ((size, mtime_ns), fingerprint)
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        """The fingerprint of the file as it is now; raises OSError if it cannot be read."""
+        st = os.stat(path)
+        stamp = (st.st_size, st.st_mtime_ns)
+        with self.lock:
+            entry = self.keys.get(path)
+        if entry is not None and entry[0] == stamp: return entry[1]
+        key = file_fingerprint(path) # Saved over or replaced since: thumbnails of the old file no longer apply
+        with self.lock:
+            self.keys[path] = (stamp, key)
+        return key
+
+class ThumbnailCache:
+    """Persistent thumbnail store under the user cache directory, capped at `max_bytes` with LRU eviction.
+
+    Entries are keyed by (file fingerprint, page index, dpi). Each is one file holding a small
+    header (magic, width, height, CRC32) and raw RGB pixels, so a hit is a single read plus
+    Image.frombuffer, with no image decoding. Truncated or damaged entries count as misses and are removed.
+    """
+    HEADER = struct.Struct("<4sHHI")
+    MAGIC = b"PDT1"
+
+    def __init__(self, directory=None, max_bytes=THUMB_CACHE_MAX_BYTES):
+        self.directory = directory or os.path.join(user_cache_dir(), "thumbnails")
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict() # file name -> size in bytes, least recently used first
+        self.total_bytes = 0
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            found = []
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith(".tmp"): # Left over from an interrupted write
+                        os.remove(entry.path)
+                    elif entry.name.endswith(".bin"):
+                        st = entry.stat()
+                        found.append((st.st_mtime_ns, entry.name, st.st_size))
+            for _, name, size in sorted(found):
+                self.entries[name] = size
+                self.total_bytes += size
+            self.enabled = True
+        except OSError:
+            self.enabled = False
+            return
+        self._evict() # The cap may have shrunk since the last session
+
+    # Thumbnails
+
+    def get(self, fingerprint, page_index, dpi):
+        payload = self._read(f"{fingerprint}-{dpi}-{page_index}.bin")
+        if payload is None: return None
+        width, height, pixels = payload
+        if len(pixels) != width * height * 3: return None
+        return Image.frombuffer("RGB", (width, height), pixels, "raw", "RGB", 0, 1)
+
+    def put(self, fingerprint, page_index, dpi, image):
+        if image.mode != "RGB": image = image.convert("RGB")
+        self._write(f"{fingerprint}-{dpi}-{page_index}.bin", image.width, image.height, image.tobytes())
+
+    # Page counts, so a cached document can be planned without parsing it
+
+    def get_page_count(self, fingerprint):
+        payload = self._read(f"{fingerprint}-pages.bin")
+        if payload is None or len(payload[2]) != 4: return None
+        return struct.unpack("<I", payload[2])[0]
+
+    def put_page_count(self, fingerprint, count):
+        self._write(f"{fingerprint}-pages.bin", 0, 0, struct.pack("<I", count))
+
+    # Storage
+
+    def _read(self, name):
+        if not self.enabled: return None
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            self._forget(name)
+            return None
+        
+        header_size = self.HEADER.size
+        if len(data) >= header_size:
+            magic, width, height, crc = self.HEADER.unpack_from(data)
+            body = memoryview(data)[header_size:]
+            if magic == self.MAGIC and zlib.crc32(body) == crc:
+                with self.lock:
+                    if name in self.entries: self.entries.move_to_end(name)
+                try: os.utime(path) # Persist recency for the next session
+                except OSError: pass
+                return width, height, body
+        
+        # Corrupt entry: drop it and report a miss
+        self._forget(name)
+        try: os.remove(path)
+        except OSError: pass
+        return None
+
+    def _write(self, name, width, height, body):
+        if not self.enabled: return
+        data = self.HEADER.pack(self.MAGIC, width, height, zlib.crc32(body)) + body
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path) # Readers never see a half-written entry
+        except OSError:
+            try: os.remove(tmp_path)
+            except OSError: pass
+            return
+        
+        with self.lock:
+            self.total_bytes += len(data) - self.entries.pop(name, 0)
+            self.entries[name] = len(data)
+        self._evict()
+
+    def _evict(self):
+        victims = []
+        with self.lock:
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                victim, size = self.entries.popitem(last=False)
+                self.total_bytes -= size
+                victims.append(victim)
+        for victim in victims:
+            try: os.remove(os.path.join(self.directory, victim))
+            except OSError: pass
+
+    def _forget(self, name):
+        with self.lock:
+            self.total_bytes -= self.entries.pop(name, 0)
+
+# --- Background Ingest ---
+
+INGEST_DPI = 40 # Thumbnail resolution; kept low for performance
+INGEST_CHUNK_PAGES = 8 # Pages rasterized per convert_from_path call
+INGEST_WORKERS = os.cpu_count() or 1 # Rasterizer processes; 1 renders on the ingest thread itself
+LAZY_RENDER_THRESHOLD = 200 # Files with more pages are only rendered on demand, near the viewport
+
+def plan_shards(counts, chunk_pages=INGEST_CHUNK_PAGES, needed=None):
+    """Splits files into (file_no, first_page, last_page) ranges (1-based, inclusive) in document order.
+
+    Every file gets at least one shard and large files are cut into page ranges,
+    so a single big scan still spreads across all workers. If `needed(file_no, page_index)`
+    is given, only runs of pages for which it returns True are planned.
+    """
+    shards = []
+    for file_no, (_, count) in enumerate(counts):
+        if needed is None:
+            runs = [(0, count)]
+        else:
+            runs, start = [], None
+            for i in range(count + 1):
+                if i < count and needed(file_no, i):
+                    if start is None: start = i
+                elif start is not None:
+                    runs.append((start, i))
+                    start = None
+        for start, stop in runs:
+            for first in range(start + 1, stop + 1, chunk_pages):
+                shards.append((file_no, first, min(first + chunk_pages - 1, stop)))
+    return shards
+
+def render_shard(fpath, first_page, last_page, dpi=INGEST_DPI):
+    """Rasterizes one page range to display-size thumbnails. Module level so process pool workers can unpickle it."""
+    with PROFILER.stage("render"):
+        return _rasterize(fpath, first_page, last_page, dpi)
+
+def _rasterize(fpath, first_page, last_page, dpi):
+    # Note: Requires Poppler installed
+    images = convert_from_path(fpath, dpi=dpi, first_page=first_page, last_page=last_page)
+    return [img.convert("RGB").resize(THUMB_SIZE) for img in images]
+
+def _render_shard_timed(fpath, first_page, last_page, dpi=INGEST_DPI):
+    # Process pool entry point: timed here, recorded by the parent, so the worker never touches PROFILER
+    start = time.perf_counter()
+    return _rasterize(fpath, first_page, last_page, dpi), time.perf_counter() - start
+
+def rasterize_shards(counts, shards, workers=INGEST_WORKERS, cancel_event=None):
+    """Yields (shard, images, error) for every shard, in the order of `shards`.
+
+    With more than one worker the shards are rendered by a process pool. At most
+    2 * workers shards are in flight, which bounds memory and lets cancel take effect quickly.
+    """
+    cancelled = lambda: cancel_event is not None and cancel_event.is_set()
+    
+    if workers <= 1 or len(shards) <= 1:
+        for shard in shards:
+            if cancelled(): return
+            file_no, first, last = shard
+            try:
+                yield shard, render_shard(counts[file_no][0], first, last), None
+            except Exception as e:
+                yield shard, None, e
+        return
+
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = deque()
+        todo = iter(shards)
+        while True:
+            while len(pending) < 2 * workers and not cancelled():
+                shard = next(todo, None)
+                if shard is None: break
+                file_no, first, last = shard
+                pending.append((shard, pool.submit(_render_shard_timed, counts[file_no][0], first, last)))
+            if not pending or cancelled(): return
+            
+            shard, future = pending.popleft()
+            try:
+                images, seconds = future.result()
+                PROFILER.add("render", seconds)
+                yield shard, images, None
+            except Exception as e:
+                yield shard, None, e
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+class IngestJob:
+    """Counts and rasterizes a batch of PDFs on a worker thread, fanning out to `workers` processes.
+
+    The worker never touches Tk. It posts events to `self.events`, which the app drains via root.after:
+        ("error", fpath, exc)              file could not be opened; it contributes no pages
+        ("planned", [(fpath, count), ...], lazy) page counts of all readable files, in selection order,
+                                           and per file whether it is left to the RenderScheduler
+        ("rendered", file_no, start, n, images) thumbnails for pages start..start+n-1 of counts[file_no]
+        ("failed", file_no, exc)           rasterizing that file failed; its pages must be dropped
+        ("finished",)                      always the last event, also after cancel
+    """
+    def __init__(self, filenames, insert_index=None, workers=INGEST_WORKERS, cache=None, sources=None):
+        self.filenames = list(filenames)
+        self.insert_index = insert_index
+        self.workers = workers
+        self.cache = cache # ThumbnailCache or None
+        self.sources = sources or SourceRegistry() # Parsed documents, shared with saving
+        self.events = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.file_pages = [] # Placeholder PageData lists per planned file, created by the app
+        self.insert_after = None # PageData the batch goes after, set by the app; edits meanwhile don't move the spot
+        self.total_pages = 0
+        self.done_pages = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        counts = []
+        keys = [] # Cache fingerprint per planned file
+        for fpath in self.filenames:
+            if self.cancelled: break
+            try:
+                key = file_fingerprint(fpath) if self.cache else None
+                count = self.cache.get_page_count(key) if self.cache else None
+                if count is None:
+                    count = self.sources.get(fpath).page_count
+                    if self.cache: self.cache.put_page_count(key, count)
+                counts.append((fpath, count))
+                keys.append(key)
+            except Exception as e:
+                self.events.put(("error", fpath, e))
+        lazy = [count > LAZY_RENDER_THRESHOLD for _, count in counts]
+        self.events.put(("planned", counts, lazy))
+
+        # Serve cache hits first; only the pages that missed are rasterized
+        cached = []
+        for file_no, (fpath, count) in enumerate(counts):
+            if lazy[file_no]:
+                cached.append([True] * count) # Nothing to do up front
+                continue
+            images = [None] * count
+            if self.cache and not self.cancelled:
+                images = [self.cache.get(keys[file_no], i, INGEST_DPI) for i in range(count)]
+                self.post_runs(file_no, images)
+            cached.append([img is not None for img in images])
+
+        failed = set()
+        shards = plan_shards(counts, needed=lambda file_no, i: not cached[file_no][i])
+        for (file_no, first, last), images, error in rasterize_shards(counts, shards, self.workers, self.cancel_event):
+            if file_no in failed: continue
+            if error is not None:
+                failed.add(file_no)
+                self.events.put(("failed", file_no, error))
+                continue
+            self.events.put(("rendered", file_no, first - 1, last - first + 1, images))
+            if self.cache:
+                for i, img in enumerate(images):
+                    self.cache.put(keys[file_no], first - 1 + i, INGEST_DPI, img)
+        self.events.put(("finished",))
+
+    def post_runs(self, file_no, images, max_run=64):
+        """Posts "rendered" events for each run of consecutive non-None images."""
+        start = None
+        for i in range(len(images) + 1):
+            hit = i < len(images) and images[i] is not None
+            if start is not None and (not hit or i - start == max_run):
+                self.events.put(("rendered", file_no, start, i - start, images[start:i]))
+                start = None
+            if hit and start is None:
+                start = i
+
+# --- On-Demand Rendering ---
+
+RENDER_BATCH_PAGES = 8 # Adjacent wanted pages rendered by one convert_from_path call
+MAX_RESIDENT_THUMBS = 3000 # Thumbnails kept in memory; the least recently viewed are evicted
+
+class RenderScheduler:
+    """Renders thumbnails of lazy or evicted pages on a worker thread, nearest to the viewport first.
+
+    The Tk thread calls `request` with the pages it wants, in priority order, whenever the viewport
+    moves; this replaces the previous wish list, so pages that scrolled away are never rendered.
+    Adjacent pages of one source are batched into a single first_page/last_page call; the open
+    project's ThumbnailPack (`pack`) and the thumbnail cache are consulted first. Finished
+    (page, image, None) triples are put on `results`; pages that could not be rendered come as
+    (page, None, message) and are kept in `failed`, so they are not requested again.
+    """
+    def __init__(self, cache=None, dpi=INGEST_DPI):
+        self.cache = cache
+        self.pack = None # ThumbnailPack of the open project, if any
+        self.dpi = dpi
+        self.fingerprints = Fingerprints() # Cache keys of the sources as they are now
+        self.wanted = [] # PageData, highest priority first
+        self.in_flight = set() # Pages taken by the worker but not yet delivered
+        self.failed = set() # Pages whose rendering failed; they keep no image
+        self.wakeup = threading.Condition()
+        self.results = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def request(self, pages):
+        with self.wakeup:
+            self.wanted = list(pages)
+            self.wakeup.notify()
+
+    def next_batch(self):
+        """Takes the most wanted page plus wanted neighbours from the same source."""
+        with self.wakeup:
+            while True:
+                self.wanted = [p for p in self.wanted
+                               if not p.has_image and p not in self.in_flight and p not in self.failed]
+                if self.wanted: break
+                self.wakeup.wait()
+            
+            first = self.wanted[0]
+            by_index = {p.page_index: p for p in self.wanted if p.source_path == first.source_path}
+            lo = hi = first.page_index
+            while hi - lo + 1 < RENDER_BATCH_PAGES and (hi + 1 in by_index or lo - 1 in by_index):
+                if hi + 1 in by_index: hi += 1
+                else: lo -= 1
+            batch = [by_index[i] for i in range(lo, hi + 1)]
+            self.in_flight.update(batch)
+            self.wanted = [p for p in self.wanted if p not in self.in_flight]
+            return first.source_path, lo, batch
+
+    def run(self):
+        while True:
+            source_path, lo, batch = self.next_batch()
+            images = [None] * len(batch)
+            error = None
+            try:
+                pack, key = self.pack, None
+                if pack or self.cache:
+                    key = self.fingerprints.get(source_path)
+                for store in (pack, self.cache):
+                    if not store: continue
+                    images = [store.get(key, p.page_index, self.dpi) if img is None else img
+                              for img, p in zip(images, batch)]
+                
+                missing = [i for i, img in enumerate(images) if img is None]
+                if missing:
+                    first, last = missing[0], missing[-1]
+                    rendered = render_shard(source_path, lo + first + 1, lo + last + 1, self.dpi)
+                    for i in range(first, last + 1):
+                        if images[i] is None and i - first < len(rendered):
+                            images[i] = rendered[i - first]
+                            if self.cache: self.cache.put(key, lo + i, self.dpi, images[i])
+            except Exception as e:
+                error = f"Rendering {os.path.basename(source_path)} failed: {e}"
+            
+            with self.wakeup:
+                for page, img in zip(batch, images):
+                    if img is None:
+                        self.failed.add(page)
+                        self.results.put((page, None, error or f"{os.path.basename(source_path)} has no page {page.page_index + 1}"))
+                    else:
+                        self.results.put((page, img, None))
+                self.in_flight.difference_update(batch)
+
+class ResidentThumbnails:
+    """Bounds how many PageData objects hold an image, evicting the least recently viewed."""
+    def __init__(self, capacity=MAX_RESIDENT_THUMBS):
+        self.capacity = capacity
+        self.pages = OrderedDict() # PageData -> None, least recently viewed first
+
+    def touch(self, pages):
+        for page in pages:
+            if page.has_image:
+                self.pages[page] = None
+                self.pages.move_to_end(page)
+
+    def evict(self):
+        """Drops images beyond capacity and returns the pages that lost them."""
+        evicted = []
+        while len(self.pages) > self.capacity:
+            page, _ = self.pages.popitem(last=False)
+            page.image = None
+            evicted.append(page)
+        return evicted
+
+# --- Page Preview ---
+
+TILE_SIZE = 256 # Preview tiles are square except along the right and bottom page edges
+TILE_CACHE_MAX_BYTES = 192 * 1024 * 1024
+TILE_BATCH = 16 # Wanted tiles of one page rendered by a single pdftoppm call
+PREVIEW_MAX_DPI = 600
+
+def page_pixel_size(size_pts, dpi):
+    """Pixel size pdftoppm gives a page of `size_pts` points at `dpi`."""
+    return math.ceil(size_pts[0] * dpi / 72), math.ceil(size_pts[1] * dpi / 72)
+
+def render_region(path, page_index, dpi, x, y, width, height):
+    """Rasterizes a pixel rectangle of one page at `dpi`, without rendering the rest of the page."""
+    # Note: Requires Poppler installed, like convert_from_path
+    n = str(page_index + 1)
+    args = ["pdftoppm", "-f", n, "-l", n, "-r", str(dpi),
+            "-x", str(x), "-y", str(y), "-W", str(width), "-H", str(height), path]
+    result = subprocess.run(args, capture_output=True, check=True) # No output root: a PPM on stdout
+    return Image.open(BytesIO(result.stdout)).convert("RGB")
+
+class TileRenderer:
+    """Renders preview tiles on a worker thread into a bounded LRU, most wanted first.
+
+    Tiles are keyed (source_path, page_index, dpi, col, row). The Tk thread calls `request` with
+    the tiles it is missing whenever the view moves; like RenderScheduler.request this replaces the
+    previous wish list. Neighbouring wanted tiles of the same page are rendered by one pdftoppm call,
+    so a heavy page is decoded once per batch rather than once per tile. Finished keys (or
+    ("error", message) pairs) are put on `results`. `request_size` looks up a page's size on the
+    worker too, since the source may not be parsed yet; it answers with ("size", (path, page_index),
+    (width, height)).
+    """
+    def __init__(self, sources, max_bytes=TILE_CACHE_MAX_BYTES):
+        self.sources = sources
+        self.max_bytes = max_bytes
+        self.tiles = OrderedDict() # key -> Image, least recently used first
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.wanted = []
+        self.size_wanted = None # (path, page_index) whose size the preview waits for
+        self.wakeup = threading.Condition()
+        self.results = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def get(self, key):
+        with self.lock:
+            tile = self.tiles.get(key)
+            if tile is not None: self.tiles.move_to_end(key)
+            return tile
+
+    def put(self, key, tile):
+        with self.lock:
+            old = self.tiles.pop(key, None)
+            if old is not None: self.total_bytes -= len(old.mode) * old.width * old.height
+            self.tiles[key] = tile
+            self.total_bytes += len(tile.mode) * tile.width * tile.height
+            while self.total_bytes > self.max_bytes and len(self.tiles) > 1:
+                _, victim = self.tiles.popitem(last=False)
+                self.total_bytes -= len(victim.mode) * victim.width * victim.height
+
+    def request(self, keys):
+        with self.wakeup:
+            self.wanted = list(keys)
+            self.wakeup.notify()
+
+    def request_size(self, path, page_index):
+        with self.wakeup:
+            self.size_wanted = (path, page_index)
+            self.wakeup.notify()
+
+    def next_batch(self):
+        """Takes the most wanted tile plus up to TILE_BATCH - 1 other wanted tiles of its page.
+
+        A pending size lookup goes first and is returned as ((path, page_index), None).
+        """
+        with self.wakeup:
+            while True:
+                if self.size_wanted is not None:
+                    page, self.size_wanted = self.size_wanted, None
+                    return page, None
+                with self.lock:
+                    self.wanted = [k for k in self.wanted if k not in self.tiles]
+                if self.wanted: break
+                self.wakeup.wait()
+            page = self.wanted[0][:3]
+            batch = [k for k in self.wanted if k[:3] == page][:TILE_BATCH]
+            self.wanted = [k for k in self.wanted if k not in batch]
+            return page, batch
+
+    def run(self):
+        while True:
+            page, batch = self.next_batch()
+            if batch is None:
+                try:
+                    self.results.put(("size", page, self.sources.get(page[0]).page_size(page[1])))
+                except Exception as e:
+                    self.results.put(("error", f"Preview of {os.path.basename(page[0])} unavailable: {e}"))
+                continue
+            path, page_index, dpi = page
+            try:
+                doc = self.sources.get(path)
+                page_w, page_h = page_pixel_size(doc.page_size(page_index), dpi)
+                cols = [k[3] for k in batch]
+                rows = [k[4] for k in batch]
+                x0, y0 = min(cols) * TILE_SIZE, min(rows) * TILE_SIZE
+                x1 = min(page_w, (max(cols) + 1) * TILE_SIZE)
+                y1 = min(page_h, (max(rows) + 1) * TILE_SIZE)
+                with PROFILER.stage("preview tiles"):
+                    region = render_region(path, page_index, dpi, x0, y0, x1 - x0, y1 - y0)
+                
+                # Every tile the region covers is cut out, wanted or not; the LRU decides what stays
+                for row in range(min(rows), max(rows) + 1):
+                    for col in range(min(cols), max(cols) + 1):
+                        box = (col * TILE_SIZE - x0, row * TILE_SIZE - y0,
+                               min(x1, (col + 1) * TILE_SIZE) - x0, min(y1, (row + 1) * TILE_SIZE) - y0)
+                        key = (path, page_index, dpi, col, row)
+                        self.put(key, region.crop(box))
+                        self.results.put(key)
+            except Exception as e:
+                self.results.put(("error", f"Preview of {os.path.basename(path)} page {page_index + 1} failed: {e}"))
+
+# --- Page Analysis ---
+
+BLANK_INK_MAX = 0.001 # Fraction of inked thumbnail pixels below which a page counts as blank
+INK_CONTRAST = 48 # Grey levels below the page's paper tone that count as ink
+EDGE_CROP = 0.06 # Fraction trimmed from each side; scanner edges and punch holes are not content
+HASH_MAX_BITS = 6 # Perceptual hash distance that makes two pages duplicate candidates
+DUPLICATE_CANDIDATES = 3 # Closest earlier candidates compared pixel by pixel per page
+DUPLICATE_MAX_DIFF = 0.12 # Mean difference of normalized pixels below which candidates are duplicates
+ANALYSIS_CHUNK = 512 # Pages per vectorized block, bounding the memory used
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    m = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    m[0] /= np.sqrt(2)
+    return m.astype(np.float32)
+
+def _popcount64(x):
+    if hasattr(np, "bitwise_count"): return np.bitwise_count(x) # NumPy 2
+    table = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+    return table[x.view(np.uint8).reshape(x.shape + (8,))].sum(axis=-1, dtype=np.uint8)
+
+def gather_thumbnails(slots, missing=None):
+    """Copies the THUMBNAILS slots into a (n, height, width, 3) uint8 array, one fancy index per slab.
+
+    Rows whose slot is negative are taken from `missing`, a dict of row -> image, and stay
+    zero if it has none.
+    """
+    store = THUMBNAILS
+    width, height = THUMB_SIZE
+    out = np.zeros((len(slots), height, width, 3), dtype=np.uint8)
+    resident = slots >= 0
+    slab_of, local = np.divmod(slots, store.slab_slots)
+    for slab_no in np.unique(slab_of[resident]):
+        slab = np.frombuffer(store.slabs[slab_no], dtype=np.uint8).reshape(store.slab_slots, height, width, 3)
+        rows = resident & (slab_of == slab_no)
+        out[rows] = slab[local[rows]]
+    for row, image in (missing or {}).items():
+        out[row] = np.asarray(image)
+    return out
+
+def page_features(images):
+    """Ink coverage and normalized 32x32 block means of a (n, height, width, 3) thumbnail stack."""
+    n, height, width, _ = images.shape
+    cy, cx = int(height * EDGE_CROP), int(width * EDGE_CROP)
+    gray = images[:, cy:height - cy, cx:width - cx].astype(np.float32) @ np.float32([0.299, 0.587, 0.114])
+    h32, w32 = gray.shape[1] // 32 * 32, gray.shape[2] // 32 * 32
+    small = gray[:, :h32, :w32].reshape(n, 32, h32 // 32, 32, w32 // 32).mean(axis=(2, 4))
+    
+    # Ink against each page's own paper tone (the brighter blocks), so grey paper still reads as blank
+    paper = np.percentile(small.reshape(n, -1), 90, axis=1)
+    ink = (gray < (paper - INK_CONTRAST)[:, None, None]).mean(axis=(1, 2))
+    
+    # Normalizing takes out exposure differences between two scans of the same sheet
+    small -= small.mean(axis=(1, 2), keepdims=True)
+    small /= small.std(axis=(1, 2), keepdims=True) + 1e-6
+    return ink, small
+
+def perceptual_hashes(small):
+    """64-bit pHashes: signs of the 8x8 lowest DCT frequencies (DC excluded) against their median."""
+    dct = _dct_matrix(small.shape[1])
+    low = (dct @ small @ dct.T)[:, :8, :8].reshape(len(small), 64)[:, 1:]
+    bits = np.pad(low > np.median(low, axis=1, keepdims=True), ((0, 0), (1, 0)))
+    return np.packbits(bits, axis=1).view(">u8").ravel().astype(np.uint64)
+
+def find_duplicates(small):
+    """For each page, the index of an earlier page it repeats, or -1.
+
+    Candidates are the DUPLICATE_CANDIDATES earlier pages closest by pHash; a candidate within
+    HASH_MAX_BITS is confirmed by the mean difference of the normalized block means.
+    """
+    n = len(small)
+    duplicate_of = np.full(n, -1, dtype=np.int64)
+    if n < 2: return duplicate_of
+    hashes = perceptual_hashes(small)
+    flat = small.reshape(n, -1)
+    order = np.arange(n)
+    for lo in range(0, n, ANALYSIS_CHUNK):
+        rows = order[lo:lo + ANALYSIS_CHUNK]
+        earlier = order[:rows[-1]] # Only earlier pages can be the original
+        if not len(earlier): continue
+        dist = _popcount64(hashes[rows, None] ^ hashes[None, earlier]).astype(np.int16)
+        dist[earlier[None, :] >= rows[:, None]] = 65
+        k = min(DUPLICATE_CANDIDATES, len(earlier))
+        nearest = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        diff = np.abs(flat[rows, None, :] - flat[nearest]).mean(axis=2)
+        match = (np.take_along_axis(dist, nearest, axis=1) <= HASH_MAX_BITS) & (diff < DUPLICATE_MAX_DIFF)
+        found = match.any(axis=1)
+        best = np.where(match, diff, np.inf).argmin(axis=1)
+        duplicate_of[rows[found]] = nearest[found, best[found]]
+    return duplicate_of
+
+class PageAnalysis:
+    """Finds blank pages and pages repeating an earlier one, on a worker thread.
+
+    Reuses the thumbnails ingest already produced: resident ones are read straight from the
+    THUMBNAILS slabs, evicted ones from `cache`; pages with neither are skipped. Works on a snapshot
+    of `pages` and reports PageData objects, so the list may be edited meanwhile. `blank`,
+    `duplicates` and `skipped` are filled in once `done` is set; `error` holds any failure.
+    """
+    available = np is not None
+    
+    def __init__(self, pages, cache=None):
+        self.pages = list(pages)
+        self.slots = np.fromiter((p.slot for p in self.pages), dtype=np.int64, count=len(self.pages))
+        self.cache = cache
+        self.fingerprints = {} # source_path -> cache key
+        self.blank = []
+        self.duplicates = [] # (page, earlier page it repeats)
+        self.skipped = 0
+        self.error = None
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def cached_images(self, rows):
+        """Thumbnail cache entries for the non-resident pages among `rows`, as row offset -> image."""
+        found = {}
+        if self.cache is None: return found
+        for offset, row in enumerate(rows):
+            if self.slots[row] >= 0: continue
+            page = self.pages[row]
+            key = self.fingerprints.get(page.source_path)
+            if key is None:
+                try: key = file_fingerprint(page.source_path)
+                except OSError: key = ""
+                self.fingerprints[page.source_path] = key
+            image = self.cache.get(key, page.page_index, INGEST_DPI) if key else None
+            if image is not None and image.size == THUMB_SIZE: found[offset] = image
+        return found
+
+    def run(self):
+        try:
+            n = len(self.pages)
+            ink = np.zeros(n, dtype=np.float32)
+            small = np.zeros((n, 32, 32), dtype=np.float32)
+            have = self.slots >= 0
+            for lo in range(0, n, ANALYSIS_CHUNK):
+                rows = np.arange(lo, min(n, lo + ANALYSIS_CHUNK))
+                missing = self.cached_images(rows)
+                have[rows[list(missing)]] = True
+                ink[rows], small[rows] = page_features(gather_thumbnails(self.slots[rows], missing))
+            
+            # A slot evicted or reused while we read it no longer shows that page
+            current = np.fromiter((p.slot for p in self.pages), dtype=np.int64, count=n)
+            have &= (self.slots < 0) | (current == self.slots)
+            self.skipped = int(n - have.sum())
+            
+            blank = have & (ink < BLANK_INK_MAX)
+            content = np.flatnonzero(have & ~blank) # Blank sheets all look alike; they are not duplicates
+            duplicate_of = find_duplicates(small[content])
+            self.blank = [self.pages[i] for i in np.flatnonzero(blank)]
+            self.duplicates = [(self.pages[content[i]], self.pages[content[j]])
+                               for i, j in zip(np.flatnonzero(duplicate_of >= 0), duplicate_of[duplicate_of >= 0])]
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done.set()
+
+# --- Output Optimization ---
+
+DEDUPE_DICT_TYPES = {"/Font", "/FontDescriptor", "/ExtGState", "/Encoding"} # Plain dicts safe to share by value
+DEDUPE_MAX_PASSES = 4 # Merging font files makes their descriptors equal, then their fonts
+COMPRESS_MIN_BYTES = 64 # Smaller streams rarely shrink under Flate
+IMAGE_JPEG_QUALITY = 85
+_IMAGE_MODES = {"/DeviceRGB": "RGB", "/DeviceGray": "L"}
+
+def format_bytes(n):
+    for unit in ("B", "KiB", "MiB"):
+        if abs(n) < 1024: return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GiB"
+
+class SaveReport:
+    """Seconds spent and bytes saved by each stage of one save, in pipeline order."""
+    def __init__(self):
+        self.stages = [] # (name, seconds, bytes_saved)
+        self.output_bytes = 0
+
+    def add(self, name, seconds, saved=0):
+        self.stages.append((name, seconds, saved))
+
+    @classmethod
+    def combined(cls, reports):
+        """One report summing the stages and output sizes of several, e.g. the outputs of a split."""
+        total, stages = cls(), {}
+        for report in reports:
+            total.output_bytes += report.output_bytes
+            for name, seconds, saved in report.stages:
+                secs, was_saved = stages.get(name, (0.0, 0))
+                stages[name] = (secs + seconds, was_saved + saved)
+        for name, (seconds, saved) in stages.items(): total.add(name, seconds, saved)
+        return total
+
+    @property
+    def total_saved(self):
+        return sum(saved for _, _, saved in self.stages)
+
+    def summary(self):
+        parts = [f"{name} {secs:.2f}s" + (f" (-{format_bytes(saved)})" if saved else "")
+                 for name, secs, saved in self.stages]
+        return f"{format_bytes(self.output_bytes)}, saved {format_bytes(self.total_saved)}: " + ", ".join(parts)
+
+def _writer_objects(writer):
+    """Yields (idnum, object) for every live object of `writer`."""
+    for i, obj in enumerate(writer._objects):
+        if obj is not None and not isinstance(obj, NullObject):
+            yield i + 1, obj
+
+def _canonical_bytes(obj):
+    # Serialized dict without /Length; references are written as "N 0 R", so they compare by target
+    buf = BytesIO()
+    for key in sorted(k for k in obj if k != "/Length"):
+        buf.write(key.encode())
+        obj[key].write_to_stream(buf, None)
+    return buf.getvalue()
+
+def _remap_references(writer, remap):
+    """Points every reference to an idnum in `remap` at its replacement, across all objects."""
+    for _, root in _writer_objects(writer):
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            entries = node.items() if isinstance(node, DictionaryObject) else enumerate(node)
+            for key, value in list(entries):
+                if isinstance(value, IndirectObject):
+                    if value.pdf is writer and value.idnum in remap:
+                        node[key] = IndirectObject(remap[value.idnum], 0, writer)
+                elif isinstance(value, (DictionaryObject, ArrayObject)):
+                    stack.append(value)
+
+def dedupe_objects(writer):
+    """Merges streams and shareable dicts that are identical byte for byte. Returns bytes saved.
+
+    add_page copies resources per source document, so the same font or logo merged from several
+    files is stored once per file. Duplicates become null objects, which keeps the xref numbering.
+    """
+    saved = 0
+    for _ in range(DEDUPE_MAX_PASSES):
+        seen, remap = {}, {}
+        for idnum, obj in _writer_objects(writer):
+            if isinstance(obj, StreamObject):
+                data = obj._data
+            elif isinstance(obj, DictionaryObject) and obj.get("/Type") in DEDUPE_DICT_TYPES:
+                data = b""
+            else:
+                continue
+            header = _canonical_bytes(obj)
+            key = (type(obj) is DictionaryObject, hashlib.blake2b(header + b"\0" + data, digest_size=16).digest())
+            first = seen.setdefault(key, idnum)
+            if first != idnum:
+                remap[idnum] = first
+                saved += len(header) + len(data)
+        if not remap: break
+        _remap_references(writer, remap)
+        for idnum in remap:
+            writer._objects[idnum - 1] = NullObject()
+    return saved
+
+def compress_streams(writer):
+    """Flate-compresses streams stored without a filter. Returns bytes saved.
+
+    PyPDF2 cannot write object streams, so this is the compression available to the writer:
+    it catches uncompressed content and metadata streams that some producers emit.
+    """
+    saved = 0
+    for idnum, obj in _writer_objects(writer):
+        if not isinstance(obj, StreamObject) or "/Filter" in obj or len(obj._data) < COMPRESS_MIN_BYTES:
+            continue
+        packed = zlib.compress(obj._data, 6)
+        if len(packed) >= len(obj._data): continue
+        encoded = EncodedStreamObject()
+        for key, value in obj.items():
+            if key != "/Length": encoded[key] = value
+        encoded[NameObject("/Filter")] = NameObject("/FlateDecode")
+        encoded._data = packed
+        writer._objects[idnum - 1] = encoded
+        saved += len(obj._data) - len(packed)
+    return saved
+
+def _page_images(writer):
+    """Maps image XObject idnum -> largest (width, height) in inches of the pages showing it."""
+    sizes = {}
+    for page in writer.pages:
+        box = page.mediabox
+        size = (float(box.width) / 72, float(box.height) / 72)
+        xobjects = page.get("/Resources", DictionaryObject()).get_object().get("/XObject")
+        if xobjects is None: continue
+        for ref in xobjects.get_object().values():
+            if not isinstance(ref, IndirectObject) or ref.get_object().get("/Subtype") != "/Image": continue
+            old = sizes.get(ref.idnum)
+            sizes[ref.idnum] = size if old is None else (max(old[0], size[0]), max(old[1], size[1]))
+    return sizes
+
+def _downsample_image(obj, page_size, target_dpi):
+    """Re-encodes one image XObject in place at `target_dpi`. Returns bytes saved (0 if untouched)."""
+    filters = obj.get("/Filter")
+    if isinstance(filters, ArrayObject): filters = filters[0] if len(filters) == 1 else None
+    mode = _IMAGE_MODES.get(obj.get("/ColorSpace"))
+    if (filters not in ("/DCTDecode", "/FlateDecode") or mode is None or obj.get("/BitsPerComponent") != 8
+            or obj.get("/ImageMask") or "/Decode" in obj or "/Mask" in obj):
+        return 0
+    width, height = int(obj["/Width"]), int(obj["/Height"])
+    # The image fits on its page, so this is a lower bound of the DPI it is shown at
+    dpi = min(width / page_size[0], height / page_size[1])
+    if dpi <= target_dpi * 1.05: return 0
+    new_size = (max(1, round(width * target_dpi / dpi)), max(1, round(height * target_dpi / dpi)))
+    try:
+        if filters == "/DCTDecode":
+            image = Image.open(BytesIO(obj._data))
+            if image.mode != mode: return 0
+            buf = BytesIO()
+            image.resize(new_size, Image.LANCZOS).save(buf, "JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True)
+            data = buf.getvalue()
+        else:
+            image = Image.frombytes(mode, (width, height), obj.get_data())
+            data = zlib.compress(image.resize(new_size, Image.LANCZOS).tobytes(), 6)
+    except Exception:
+        return 0 # Leave anything PIL cannot decode as it was
+    if len(data) >= len(obj._data): return 0
+    saved = len(obj._data) - len(data)
+    obj._data = data
+    obj.decoded_self = None
+    obj[NameObject("/Filter")] = NameObject(filters)
+    obj[NameObject("/Width")] = NumberObject(new_size[0])
+    obj[NameObject("/Height")] = NumberObject(new_size[1])
+    if "/DecodeParms" in obj: del obj["/DecodeParms"]
+    return saved
+
+def downsample_images(writer, target_dpi):
+    """Downsamples 8-bit RGB/gray JPEG and Flate images shown above `target_dpi`. Returns bytes saved."""
+    saved = 0
+    for idnum, page_size in _page_images(writer).items():
+        obj = writer._objects[idnum - 1]
+        if isinstance(obj, EncodedStreamObject):
+            saved += _downsample_image(obj, page_size, target_dpi)
+    return saved
+
+# --- Saving ---
+
+_UMASK = os.umask(0); os.umask(_UMASK) # Read once at import; os.umask can only be queried by setting it
+SAVE_PROGRESS_EVERY = 25 # Pages between progress callbacks
+
+class SaveCancelled(Exception):
+    pass
+
+class CancellableStream:
+    """File wrapper that aborts writer.write as soon as the save is cancelled."""
+    def __init__(self, f, cancel_event):
+        self.f = f
+        self.cancel_event = cancel_event
+
+    def write(self, data):
+        if self.cancel_event.is_set(): raise SaveCancelled()
+        return self.f.write(data)
+
+    def tell(self):
+        return self.f.tell()
+
+def optimize_writer(writer, report, image_dpi=None, cancel_event=None, profiler=PROFILER):
+    """Runs the optimization stages on an assembled writer, recording each in `report` (and `profiler`)."""
+    stage_of = profiler.stage if profiler else lambda name: nullcontext()
+    stages = [("dedupe", dedupe_objects), ("compress", compress_streams)]
+    if image_dpi: stages.append(("downsample", lambda w: downsample_images(w, image_dpi)))
+    for name, stage in stages:
+        if cancel_event and cancel_event.is_set(): raise SaveCancelled()
+        start = time.perf_counter()
+        with stage_of(name):
+            saved = stage(writer)
+        report.add(name, time.perf_counter() - start, saved)
+
+def write_pdf(pages, output_path, sources=None, progress=None, cancel_event=None, optimize=True, image_dpi=None,
+              profiler=PROFILER):
+    """Streams (source_path, page_index) pairs into a new PDF at `output_path`. Returns a SaveReport.
+
+    Each source is parsed once (via `sources`, if given). Unless `optimize` is false, duplicate
+    resources are merged and uncompressed streams deflated before writing; with `image_dpi`, images
+    shown above that resolution are downsampled too. The PDF is written to a temp file next to
+    `output_path` and renamed over it only on success, so a failed or cancelled save never leaves
+    a truncated file behind. `progress(stage, done, total)` is called with stage "assemble" every
+    SAVE_PROGRESS_EVERY pages, then once each with "optimize" and "write". Raises SaveCancelled if
+    `cancel_event` is set. Stages are also recorded in `profiler` unless it is None.
+    """
+    cancel_event = cancel_event or threading.Event()
+    stage_of = profiler.stage if profiler else lambda name: nullcontext()
+    report = SaveReport()
+    tmp_path = None
+    try:
+        writer = PdfWriter()
+        total = len(pages)
+        with SourcePool(sources) as pool:
+            start = time.perf_counter()
+            with stage_of("assemble"):
+                for done, (src, idx) in enumerate(pages, 1):
+                    if cancel_event.is_set(): raise SaveCancelled()
+                    pool.add_page_to(writer, src, idx)
+                    if progress and (done % SAVE_PROGRESS_EVERY == 0 or done == total):
+                        progress("assemble", done, total)
+            report.add("assemble", time.perf_counter() - start)
+            
+            if optimize:
+                if progress: progress("optimize", total, total)
+                optimize_writer(writer, report, image_dpi, cancel_event, profiler)
+            
+            if progress: progress("write", total, total)
+            start = time.perf_counter()
+            folder = os.path.dirname(os.path.abspath(output_path))
+            fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=".pdf.tmp", dir=folder)
+            try: # mkstemp creates 0600; keep the permissions a plain open() would give
+                mode = os.stat(output_path).st_mode & 0o777
+            except OSError:
+                mode = 0o666 & ~_UMASK
+            os.chmod(tmp_path, mode)
+            with os.fdopen(fd, "wb") as f_out, stage_of("write"):
+                writer.write(CancellableStream(f_out, cancel_event))
+                f_out.flush()
+                os.fsync(f_out.fileno())
+                report.output_bytes = f_out.tell()
+            report.add("write", time.perf_counter() - start)
+        
+        if cancel_event.is_set(): raise SaveCancelled()
+        if sources is not None: sources.release(output_path) # Saving over a source; a pool-owned registry is closed already
+        os.replace(tmp_path, output_path) # Atomic on the same filesystem
+        tmp_path = None
+        return report
+    finally:
+        if tmp_path:
+            try: os.remove(tmp_path)
+            except OSError: pass
+
+class SaveJob:
+    """Runs write_pdf on a worker thread for the editor.
+
+    Works on a snapshot of (source_path, page_index) pairs, so the grid can be edited meanwhile.
+    Events for the Tk thread:
+        ("progress", done, total)   pages added to the writer so far
+        ("optimizing",)             all pages added, deduplicating and compressing
+        ("writing",)                writing the file
+        ("finished", error)         error is None on success, SaveCancelled if cancelled
+    On success `report` holds the SaveReport.
+    """
+    def __init__(self, pages, output_path, sources=None, image_dpi=None):
+        self.pages = [(p.source_path, p.page_index) for p in pages]
+        self.source_paths = {src for src, _ in self.pages}
+        self.output_path = output_path
+        self.sources = sources or SourceRegistry()
+        self.image_dpi = image_dpi
+        self.report = None
+        self.events = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def on_progress(self, stage, done, total):
+        if stage == "assemble": self.events.put(("progress", done, total))
+        else: self.events.put(({"optimize": "optimizing", "write": "writing"}[stage],))
+
+    def run(self):
+        try:
+            self.report = write_pdf(self.pages, self.output_path, self.sources, self.on_progress,
+                                    self.cancel_event, image_dpi=self.image_dpi)
+            self.events.put(("finished", None))
+        except Exception as e:
+            self.events.put(("finished", e))
+
+# --- Split Export ---
+
+SPLIT_NAME = "{n:03d}_{source}.pdf" # Default output name; {n} counts from 1, {source} is the first page's file stem
+SPLIT_CHUNKS_PER_WORKER = 4 # Contiguous output chunks handed to each export worker, for load balance
+
+def groups_every(count, n):
+    """Splits positions 0..count into groups of `n` pages (the last may be shorter)."""
+    if n < 1: raise ValueError("pages per output must be at least 1")
+    return [[(start, min(start + n, count))] for start in range(0, count, n)]
+
+def groups_by_source(pages):
+    """One group per run of consecutive pages from the same source file."""
+    groups = []
+    for i, (src, _) in enumerate(pages):
+        if not groups or pages[i - 1][0] != src: groups.append([(i, i + 1)])
+        else: groups[-1][0] = (groups[-1][0][0], i + 1)
+    return groups
+
+def split_outputs(pages, groups, folder, name=SPLIT_NAME):
+    """Resolves groups of position ranges into [(output_path, [(source_path, page_index)])].
+
+    `name` is formatted with n (1-based output number), source (stem of the group's first source
+    file), first and last (1-based positions). Raises ValueError if two outputs get the same path.
+    """
+    outputs, seen = [], set()
+    for n, ranges in enumerate(groups, 1):
+        part = [pages[i] for start, stop in ranges for i in range(start, stop)]
+        if not part: continue
+        first = ranges[0][0] + 1
+        source = os.path.splitext(os.path.basename(part[0][0]))[0]
+        try:
+            path = os.path.join(folder, name.format(n=n, source=source, first=first, last=ranges[-1][1]))
+        except (KeyError, IndexError, ValueError) as e:
+            raise ValueError(f"bad output name {name!r}: {e}") from e
+        if path in seen: raise ValueError(f"two outputs would both be written to {path}")
+        seen.add(path)
+        outputs.append((path, part))
+    return outputs
+
+_worker_sources = None # Export worker process: sources parsed by earlier chunks, reused by later ones
+
+def _write_parts(parts, optimize=True, image_dpi=None):
+    # Process pool entry point; errors come back as text so they always pickle
+    global _worker_sources
+    if _worker_sources is None: _worker_sources = SourceRegistry()
+    done = []
+    try:
+        for path, part in parts:
+            done.append((path, write_pdf(part, path, _worker_sources, optimize=optimize, image_dpi=image_dpi,
+                                         profiler=None)))
+        return done, None
+    except Exception as e:
+        return done, f"{os.path.basename(path)}: {type(e).__name__}: {e}"
+
+def export_split(outputs, sources=None, workers=INGEST_WORKERS, progress=None, cancel_event=None,
+                 optimize=True, image_dpi=None):
+    """Writes each (output_path, pages) of `outputs` as its own PDF. Returns [(output_path, SaveReport)].
+
+    With one worker, every output is assembled from the same parsed sources (via `sources`, if
+    given). Otherwise contiguous chunks of outputs go to a process pool whose workers each parse a
+    source once, the first time one of their outputs needs it, however many outputs use it.
+    `progress(done, total)` is called as outputs finish. Each output is written atomically by
+    write_pdf; on cancel, outputs already written stay and SaveCancelled is raised.
+    """
+    cancel_event = cancel_event or threading.Event()
+    total = len(outputs)
+    written = []
+    if workers <= 1 or total <= 1:
+        registry = sources or SourceRegistry()
+        try:
+            for path, part in outputs:
+                if cancel_event.is_set(): raise SaveCancelled()
+                written.append((path, write_pdf(part, path, registry, cancel_event=cancel_event,
+                                                optimize=optimize, image_dpi=image_dpi)))
+                if progress: progress(len(written), total)
+        finally:
+            if sources is None: registry.close_all()
+        return written
+    
+    size = max(1, math.ceil(total / (workers * SPLIT_CHUNKS_PER_WORKER)))
+    chunks = [outputs[i:i + size] for i in range(0, total, size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_write_parts, chunk, optimize, image_dpi) for chunk in chunks]
+        try:
+            for future in futures: # In order, so `written` keeps the order of `outputs`
+                while True:
+                    if cancel_event.is_set(): raise SaveCancelled()
+                    try:
+                        done, error = future.result(timeout=0.2)
+                        break
+                    except FuturesTimeout:
+                        pass
+                written.extend(done)
+                for _, report in done: # Timed in the worker, recorded here
+                    for name, seconds, _ in report.stages: PROFILER.add(name, seconds)
+                if error: raise RuntimeError(error)
+                if progress: progress(len(written), total)
+        except BaseException:
+            for future in futures: future.cancel()
+            raise
+    return written
+
+class SplitJob(SaveJob):
+    """Runs export_split on a worker thread for the editor, with SaveJob's events.
+
+    ("progress", done, total) counts outputs rather than pages. On success `reports` holds
+    [(output_path, SaveReport)].
+    """
+    def __init__(self, outputs, sources=None, workers=INGEST_WORKERS, image_dpi=None):
+        super().__init__([], None, sources, image_dpi)
+        self.outputs = outputs
+        self.source_paths = {src for _, part in outputs for src, _ in part}
+        self.workers = workers
+        self.reports = []
+
+    def on_progress(self, done, total):
+        self.events.put(("progress", done, total))
+
+    def run(self):
+        try:
+            self.reports = export_split(self.outputs, self.sources, self.workers, self.on_progress,
+                                        self.cancel_event, image_dpi=self.image_dpi)
+            self.events.put(("finished", None))
+        except Exception as e:
+            self.events.put(("finished", e))
+
+# --- Project Files ---
+
+PROJECT_VERSION = 1
+PROJECT_SUFFIX = ".pdfproj"
+
+class ProjectError(Exception):
+    pass
+
+class ThumbnailPack:
+    """The thumbnails of a saved project: one side file, memory-mapped and read only on demand.
+
+    Entries are keyed like ThumbnailCache entries, by (source fingerprint, page index), so pages of
+    a source that changed since the project was saved simply miss and get rendered again. Layout:
+    a header (magic, width, height, count), `count` raw RGB thumbnails, then their `count`
+    (source number, page index) pairs, so thumbnails are streamed out as they are written.
+    `get` and `close` may be called from different threads.
+    """
+    HEADER = struct.Struct("<4sHHI")
+    ENTRY = struct.Struct("<II")
+    MAGIC = b"PDP1"
+
+    def __init__(self, path, fingerprints):
+        self.slots = {}
+        self.map = None
+        self.lock = threading.Lock()
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < self.HEADER.size: raise ProjectError(f"{path} is truncated")
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, width, height, count = self.HEADER.unpack_from(self.map)
+        self.data_offset = self.HEADER.size
+        index_offset = self.data_offset + count * ThumbnailStore.SLOT_BYTES
+        if magic != self.MAGIC or (width, height) != THUMB_SIZE or \
+                len(self.map) != index_offset + count * self.ENTRY.size:
+            self.close()
+            raise ProjectError(f"{path} is not a thumbnail pack for this version")
+        for slot, (source_no, page_index) in enumerate(self.ENTRY.iter_unpack(self.map[index_offset:])):
+            if source_no < len(fingerprints): self.slots[(fingerprints[source_no], page_index)] = slot
+
+    def get(self, fingerprint, page_index, dpi=INGEST_DPI):
+        slot = self.slots.get((fingerprint, page_index))
+        if slot is None: return None
+        offset = self.data_offset + slot * ThumbnailStore.SLOT_BYTES
+        with self.lock:
+            if self.map is None: return None
+            pixels = self.map[offset:offset + ThumbnailStore.SLOT_BYTES]
+        return Image.frombytes("RGB", THUMB_SIZE, pixels)
+
+    def close(self):
+        with self.lock:
+            if self.map is not None: self.map.close()
+            self.map = None
+
+    @classmethod
+    def write(cls, path, entries, before_replace=None):
+        """Writes (source_no, page_index, rgb_bytes) entries to `path`, atomically.
+
+        `before_replace()` is called once every entry is written, just before the new file takes
+        the place of the old one: Windows cannot replace a pack that is still mapped.
+        """
+        tmp_path = f"{path}.tmp"
+        index = []
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(cls.HEADER.pack(cls.MAGIC, THUMB_SIZE[0], THUMB_SIZE[1], 0))
+                for source_no, page_index, pixels in entries:
+                    f.write(pixels)
+                    index.append(cls.ENTRY.pack(source_no, page_index))
+                f.write(b"".join(index))
+                f.seek(0)
+                f.write(cls.HEADER.pack(cls.MAGIC, THUMB_SIZE[0], THUMB_SIZE[1], len(index)))
+            if before_replace: before_replace()
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+
+def save_project(path, pages, output_path="", thumbnail=None, pack=None):
+    """Saves the ordered pages, the output path and source fingerprints to a project file at `path`.
+
+    Pages run-length encoded as (source number, first page, count) keep the file small for long
+    documents. Thumbnails go to `path` + ".thumbs": resident ones, plus whatever `thumbnail(page)`
+    returns for the others (None to leave a page out). `pack`, the ThumbnailPack `thumbnail` reads
+    from, is closed once they are written, so its file can be replaced. Returns the new pack.
+    """
+    folder = os.path.dirname(os.path.abspath(path))
+    sources, source_no, runs = [], {}, []
+    for page in pages:
+        no = source_no.get(page.source_path)
+        if no is None:
+            no = source_no[page.source_path] = len(sources)
+            try: fingerprint = file_fingerprint(page.source_path)
+            except OSError: fingerprint = ""
+            sources.append({"path": os.path.abspath(page.source_path), "fingerprint": fingerprint,
+                            "relpath": os.path.relpath(os.path.abspath(page.source_path), folder)})
+        if runs and runs[-1][0] == no and runs[-1][1] + runs[-1][2] == page.page_index:
+            runs[-1][2] += 1
+        else:
+            runs.append([no, page.page_index, 1])
+    
+    def thumbnails():
+        seen = set()
+        for page in pages:
+            key = (source_no[page.source_path], page.page_index)
+            if key in seen: continue
+            if page.has_image:
+                pixels = bytes(THUMBNAILS.view(page.slot))
+            else:
+                image = thumbnail(page) if thumbnail else None
+                if image is None: continue
+                pixels = image.tobytes()
+            seen.add(key)
+            yield key + (pixels,)
+    
+    thumbs_path = path + ".thumbs"
+    ThumbnailPack.write(thumbs_path, thumbnails(), pack.close if pack else None)
+    project = {"version": PROJECT_VERSION, "output": output_path, "thumbnails": os.path.basename(thumbs_path),
+               "sources": sources, "pages": runs}
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding="utf-8") as f:
+            json.dump(project, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+    return ThumbnailPack(thumbs_path, [source["fingerprint"] for source in sources])
+
+class Project:
+    """A project file read back by `load_project`.
+
+    `pages` are new PageData in saved order, without images; `pack` serves their thumbnails.
+    `stale` lists sources whose fingerprint changed (their pages render again), `missing` sources
+    that no longer exist (their pages are dropped), and `fingerprints` the current fingerprint of
+    every source found, for seeding a RenderScheduler.
+    """
+    def __init__(self, path, pages, output_path, pack, stale, missing, fingerprints):
+        self.path = path
+        self.pages = pages
+        self.output_path = output_path
+        self.pack = pack
+        self.stale = stale
+        self.missing = missing
+        self.fingerprints = fingerprints
+
+def load_project(path, sources=None):
+    """Reads a project file. Raises ProjectError if it is unreadable or from another version."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            project = json.load(f)
+        if project.get("version") != PROJECT_VERSION: raise ProjectError(f"{path}: unsupported project version")
+        saved_sources, runs = project["sources"], project["pages"]
+    except (OSError, ValueError, KeyError, AttributeError) as e:
+        raise ProjectError(f"Cannot read {path}: {e}") from e
+    
+    folder = os.path.dirname(os.path.abspath(path))
+    paths, stale, missing, fingerprints = [], [], [], {}
+    for entry in saved_sources:
+        source_path = entry["path"]
+        moved = os.path.normpath(os.path.join(folder, entry.get("relpath", "")))
+        if not os.path.exists(source_path) and entry.get("relpath") and os.path.exists(moved):
+            source_path = moved # Project and sources were moved together
+        try:
+            fingerprint = fingerprints[source_path] = file_fingerprint(source_path)
+        except OSError:
+            missing.append(source_path)
+            source_path = None
+        else:
+            if fingerprint != entry["fingerprint"]: stale.append(source_path)
+        paths.append(source_path)
+    
+    # Changed sources may have fewer pages now
+    limits = {}
+    registry = sources or SourceRegistry()
+    for source_path in stale:
+        try: limits[source_path] = registry.get(source_path).page_count
+        except Exception: limits[source_path] = 0
+    if sources is None: registry.close_all()
+    pages = []
+    for source_no, first, count in runs:
+        source_path = paths[source_no]
+        if source_path is None: continue
+        stop = min(first + count, limits.get(source_path, first + count))
+        pages.extend(PageData(source_path, i) for i in range(first, stop))
+    
+    pack = None
+    thumbs_path = os.path.join(folder, project.get("thumbnails") or "")
+    if project.get("thumbnails") and os.path.exists(thumbs_path):
+        try: pack = ThumbnailPack(thumbs_path, [entry["fingerprint"] for entry in saved_sources])
+        except (OSError, ProjectError, ValueError): pack = None # Thumbnails are only a speed-up
+    return Project(path, pages, project.get("output", ""), pack, stale, missing, fingerprints)
+
+# --- Batch CLI ---
+
+class ScriptError(Exception):
+    pass
+
+def run_script(script_path, optimize=True, image_dpi=None, workers=1):
+    """Executes one page-spec script headlessly. Returns (output_path, SaveReport) for each output.
+
+    `workers` processes write the outputs of a split command.
+    """
+    base = os.path.dirname(os.path.abspath(script_path))
+    resolve = lambda path: os.path.join(base, os.path.expanduser(path))
+    doc = PageList(undo_limit=0) # Scripts never undo
+    saved = []
+    try:
+        with open(script_path, encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                try:
+                    args = shlex.split(line, comments=True)
+                    if not args: continue
+                    command, args = args[0].lower(), args[1:]
+                    if command == "add" and len(args) in (1, 2):
+                        path = resolve(args[0])
+                        ranges = parse_page_ranges(args[1], doc.sources.get(path).page_count) if len(args) == 2 else None
+                        doc.append(doc.open_file(path, ranges))
+                    elif command == "insert" and len(args) in (2, 3):
+                        pos = int(args[0])
+                        if not 1 <= pos <= len(doc) + 1: raise ValueError(f"position {pos} out of range")
+                        path = resolve(args[1])
+                        ranges = parse_page_ranges(args[2], doc.sources.get(path).page_count) if len(args) == 3 else None
+                        doc.insert(pos - 1, doc.open_file(path, ranges))
+                    elif command == "delete" and args:
+                        doc.delete(doc.select(" ".join(args)))
+                    elif command == "move" and len(args) == 2:
+                        src, dst = int(args[0]), int(args[1])
+                        if not (1 <= src <= len(doc) and 1 <= dst <= len(doc)):
+                            raise ValueError(f"move {src} {dst} out of range")
+                        doc.move(src - 1, dst - 1)
+                    elif command == "clear" and not args:
+                        doc.clear()
+                    elif command == "save" and len(args) == 1:
+                        if not len(doc): raise ValueError("no pages to save")
+                        output_path = resolve(args[0])
+                        saved.append((output_path, doc.save(output_path, optimize=optimize, image_dpi=image_dpi)))
+                    elif command == "split" and 2 <= len(args) <= 4:
+                        if not len(doc): raise ValueError("no pages to split")
+                        pages = [(p.source_path, p.page_index) for p in doc.pages]
+                        if args[0].lower() == "every" and len(args) >= 3:
+                            groups, args = groups_every(len(doc), int(args[1])), args[2:]
+                        elif args[0].lower() == "files":
+                            groups, args = groups_by_source(pages), args[1:]
+                        else:
+                            groups, args = [doc.select(clause) for clause in args[0].split(";")], args[1:]
+                        if not 1 <= len(args) <= 2: raise ValueError(f"wrong arguments: {line.strip()}")
+                        folder = resolve(args[0])
+                        os.makedirs(folder, exist_ok=True)
+                        outputs = split_outputs(pages, groups, folder, *args[1:])
+                        saved.extend(export_split(outputs, doc.sources, workers, optimize=optimize, image_dpi=image_dpi))
+                    else:
+                        raise ValueError(f"unknown command or wrong arguments: {line.strip()}")
+                except (ValueError, OSError) as e:
+                    raise ScriptError(f"{script_path}:{line_no}: {e}") from e
+    finally:
+        doc.sources.close_all()
+    return saved
+
+def _run_job(script_path, optimize=True, image_dpi=None, workers=1):
+    # Process pool entry point: report errors as text so they always pickle
+    try:
+        return script_path, run_script(script_path, optimize, image_dpi, workers), None
+    except Exception as e:
+        return script_path, [], f"{type(e).__name__}: {e}"
+
+def run_jobs(script_paths, workers=INGEST_WORKERS, optimize=True, image_dpi=None):
+    """Runs scripts in parallel and yields (script, [(output, SaveReport)], error) in input order.
+
+    A single script gets the workers for its split commands instead.
+    """
+    job = partial(_run_job, optimize=optimize, image_dpi=image_dpi)
+    if workers <= 1 or len(script_paths) <= 1:
+        yield from map(partial(job, workers=workers), script_paths)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(job, script_paths)
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Run PDF page-spec scripts without the GUI.",
+                                     epilog=__doc__.split("\n\n", 2)[2], formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scripts", nargs="+", metavar="SCRIPT")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS,
+                        help=f"scripts (or the outputs of one script's split) written in parallel (default: {INGEST_WORKERS})")
+    parser.add_argument("--no-optimize", dest="optimize", action="store_false",
+                        help="skip resource deduplication and stream compression")
+    parser.add_argument("--image-dpi", type=int, metavar="DPI",
+                        help="downsample images shown above DPI (default: keep images as they are)")
+    args = parser.parse_args(argv)
+
+    failed = 0
+    for script, saved, error in run_jobs(args.scripts, args.workers, args.optimize, args.image_dpi):
+        if error:
+            failed += 1
+            print(f"FAIL {script}: {error}", file=sys.stderr)
+        elif not saved:
+            print(f"ok   {script} -> (nothing saved)")
+        else:
+            for output_path, report in saved:
+                print(f"ok   {script} -> {output_path}\n       {report.summary()}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())